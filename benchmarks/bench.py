@@ -0,0 +1,554 @@
+"""Benchmarks of placefinder hot paths, without spending any quota
+
+Crawls run against the local stand-in server of benchmarks.server.
+
+    uv run -m benchmarks.bench --sizes 1000 10000 100000 --crawl-sizes 1000 10000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+from rich import box
+from rich.table import Table
+
+os.environ.setdefault("GMAPS_API_KEY", "AIza-benchmark")
+
+from benchmarks.server import CENTER, KEYWORDS, FakeMapsServer, World  # noqa: E402
+from placefinder import console  # noqa: E402
+from placefinder.env import get_env  # noqa: E402
+from placefinder.planner import SearchPlanner  # noqa: E402
+from placefinder.quota import RequestScheduler  # noqa: E402
+from placefinder.ratelimit import RateLimiter  # noqa: E402
+from placefinder.services.GMaps import PAGE_TOKEN_DELAY, PRICES, GMapsService  # noqa: E402
+from placefinder.store import STORE_BATCH_SIZE, PlaceStore  # noqa: E402
+from placefinder.t import Place, PlaceCollection  # noqa: E402
+
+# Modules taking long to import, only loaded by the code paths needing them
+HEAVY_MODULES = ["easyocr", "torch", "cv2", "googlemaps", "httpx", "numpy", "dotenv"]
+
+
+class BenchResult(BaseModel):
+    name: str
+    size: int
+    seconds: float
+    throughput: float
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    peak_mb: Optional[float] = None
+
+
+def percentiles(latencies: list[float]) -> dict[str, Optional[float]]:
+    if len(latencies) < 2:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+def measure(
+    name: str,
+    size: int,
+    fn: Callable[[], Optional[list[float]]],
+    memory: bool,
+) -> BenchResult:
+    """Run `fn` once, it may return latencies to compute percentiles from"""
+    if memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    latencies = fn() or []
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+    return BenchResult(
+        name=name,
+        size=size,
+        seconds=seconds,
+        throughput=size / seconds if seconds else 0,
+        peak_mb=peak_mb,
+        **percentiles(latencies),
+    )
+
+
+def service(base_url: str, page_token_delay: float = 0) -> GMapsService:
+    """Service sending every request, as fast as the server answers"""
+    get_env().GMAPS_BASE_URL = base_url
+    quotas: dict[str, Optional[int]] = {endpoint: None for endpoint in PRICES}
+    gmaps = GMapsService(
+        rate_limiter=RateLimiter(10_000, burst=100),
+        scheduler=RequestScheduler(quotas, PRICES),
+    )
+    gmaps.page_token_delay = page_token_delay
+
+    return gmaps
+
+
+def raw_places(world: World, gmaps: GMapsService) -> list[dict]:
+    return [gmaps._place_info(world.place(i), {}) for i in range(world.size)]
+
+
+def bench_sanitize(size: int, memory: bool) -> BenchResult:
+    world = World(size)
+    gmaps = service("http://127.0.0.1:0")
+    raws = raw_places(world, gmaps)
+
+    def sanitize() -> None:
+        gmaps.sanitize(raws)
+
+    return measure("sanitize", size, sanitize, memory)
+
+
+def bench_store(size: int, memory: bool) -> BenchResult:
+    world = World(size)
+    gmaps = service("http://127.0.0.1:0")
+    loaded: list[Place] = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = PlaceStore(f"{directory}/places.sqlite")
+        store.upsert_many(gmaps.sanitize(raw_places(world, gmaps)))
+
+        def load() -> None:
+            loaded.extend(store.iter_places())
+
+        result = measure("store.iter_places", size, load, memory)
+        store.close()
+
+    return result
+
+
+def bench_collection(size: int, memory: bool) -> list[BenchResult]:
+    world = World(size)
+    gmaps = service("http://127.0.0.1:0")
+    places = gmaps.sanitize(raw_places(world, gmaps))
+    collection = PlaceCollection()
+
+    def add() -> None:
+        for place in places:
+            collection.add_place(place)
+
+    def summary() -> list[float]:
+        latencies = []
+        for query in (
+            lambda: collection.get_top_rated(100),
+            collection.get_rating_distribution,
+            collection.get_district_distribution,
+        ):
+            start = time.perf_counter()
+            query()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    def columnar() -> list[float]:
+        view = collection.columnar()
+        latencies = []
+        for query in (
+            lambda: view.top_rated(100),
+            view.rating_distribution,
+            view.district_distribution,
+        ):
+            start = time.perf_counter()
+            query()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    return [
+        measure("collection.add_place", size, add, memory),
+        measure("collection.summary", size, summary, memory),
+        measure("collection.columnar", size, columnar, memory),
+    ]
+
+
+def bench_spatial(size: int, memory: bool) -> list[BenchResult]:
+    world = World(size)
+    gmaps = service("http://127.0.0.1:0")
+    collection = PlaceCollection()
+    for place in gmaps.sanitize(raw_places(world, gmaps)):
+        collection.add_place(place)
+
+    # Points spread over the searched area
+    step = max(1, size // 100)
+    points = [(world.lat[i], world.lng[i]) for i in range(0, size, step)]
+
+    def build() -> None:
+        collection.spatial()
+
+    def queries(query: Callable[[float, float], object]) -> Callable[[], list[float]]:
+        def fn() -> list[float]:
+            latencies = []
+            for latitude, longitude in points:
+                start = time.perf_counter()
+                query(latitude, longitude)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        return fn
+
+    def density() -> None:
+        collection.get_density(500, 10)
+
+    return [
+        measure("spatial.build", size, build, memory),
+        measure(
+            "spatial.within 500 m",
+            len(points),
+            queries(lambda lat, lng: collection.get_places_within(lat, lng, 500)),
+            memory,
+        ),
+        measure(
+            "spatial.nearest 10",
+            len(points),
+            queries(lambda lat, lng: collection.get_nearest(lat, lng, 10)),
+            memory,
+        ),
+        measure("spatial.density", 1, density, memory),
+    ]
+
+
+def bench_collection_memory(size: int) -> list[BenchResult]:
+    """Peak memory of collections built from places loaded in batches, as from the store"""
+    world = World(size)
+    gmaps = service("http://127.0.0.1:0")
+    raws = raw_places(world, gmaps)
+
+    def build(compact: bool) -> Callable[[], None]:
+        def fn() -> None:
+            collection = PlaceCollection(compact=compact)
+            for start in range(0, size, STORE_BATCH_SIZE):
+                for place in gmaps.sanitize(raws[start : start + STORE_BATCH_SIZE]):
+                    collection.add_place(place)
+
+        return fn
+
+    return [
+        measure("collection.memory", size, build(compact=False), memory=True),
+        measure("collection.memory compact", size, build(compact=True), memory=True),
+    ]
+
+
+def timed(latencies: list[float], fn: Callable) -> Callable:
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def bench_crawl(
+    size: int, latency: float, error_rate: float, token_delay: float, memory: bool
+) -> BenchResult:
+    world = World(size)
+    found: list[Place] = []
+
+    with FakeMapsServer(
+        world, latency=latency, error_rate=error_rate, token_delay=token_delay
+    ) as server:
+        gmaps = service(server.base_url, PAGE_TOKEN_DELAY if token_delay else 0)
+
+        latencies: list[float] = []
+        for method in ("geocode", "places_nearby", "place"):
+            setattr(gmaps.gmaps, method, timed(latencies, getattr(gmaps.gmaps, method)))
+
+        def crawl() -> list[float]:
+            found.extend(
+                gmaps.get_places(
+                    "paris, france",
+                    KEYWORDS,
+                    radius=10000,
+                    planner=SearchPlanner(min_tile_size=100),
+                )
+            )
+            return latencies
+
+        with console.capture():
+            result = measure("crawl", size, crawl, memory)
+
+    console.print(
+        f"[grey70]crawl {size}: found {len(found)} places with "
+        f"{sum(server.requests.values())} requests {server.requests}[/]"
+    )
+    return result
+
+
+def bench_ocr(
+    size: int,
+    photos: int,
+    text_rate: float,
+    portrait_rate: float,
+    batch_size: int,
+    hashes: bool,
+    memory: bool,
+    found: Optional[dict[str, list[str]]] = None,
+) -> Optional[BenchResult]:
+    """Time analyzing the photos of places with the real reader
+
+    Args:
+        found (dict[str, list[str]], optional): Filled with the terms of each place,
+            by place_id
+    """
+    try:
+        from placefinder.ocr.hashes import PhotoHashIndex
+        from placefinder.ocr.VisualAnalyzer import VisualAnalyzer
+    except ImportError as e:
+        console.print(f"[yellow]Skipping OCR benchmark: {e}[/]")
+        return None
+
+    world = World(size, center=CENTER, photos=photos, portrait_rate=portrait_rate)
+
+    with (
+        FakeMapsServer(world, text_rate=text_rate) as server,
+        tempfile.TemporaryDirectory() as directory,
+    ):
+        gmaps = service(server.base_url)
+        places = gmaps.sanitize(raw_places(world, gmaps))
+        analyzer = VisualAnalyzer(
+            languages=["en"],
+            batch_size=batch_size,
+            hashes=PhotoHashIndex(f"{directory}/hashes.sqlite") if hashes else None,
+        )
+
+        def analyze() -> list[float]:
+            latencies = []
+            start = time.perf_counter()
+            for place, terms in analyzer.analyze_places(places):
+                if found is not None:
+                    found[place.place_id] = sorted(terms)
+                now = time.perf_counter()
+                latencies.append(now - start)
+                start = now
+            return latencies
+
+        name = f"ocr batch {batch_size}" + (" hashes" if hashes else "")
+        result = measure(name, size, analyze, memory)
+        analyzer.close()
+        if analyzer.hashes is not None:
+            analyzer.hashes.close()
+
+    return result
+
+
+def bench_photo_matches() -> None:
+    """Report how often the signs served match each other by perceptual hash
+
+    Copies of a sign should match, signs with a different text should not: those
+    matching by hash alone would reuse wrong terms without the thumbnail check.
+    """
+    from itertools import combinations
+
+    import cv2
+    import numpy as np
+
+    from benchmarks.server import PHOTO_QUALITIES, SIGN_TEXTS, photo_bytes
+    from placefinder.ocr.hashes import (
+        HASH_MAX_DISTANCE,
+        dhash,
+        distance,
+        same_photo,
+        thumbnail,
+    )
+
+    photos = []
+    for text in (*SIGN_TEXTS, ""):
+        for quality in PHOTO_QUALITIES:
+            for portrait in (False, True):
+                data = photo_bytes(text, quality, portrait)
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                assert image is not None
+                photos.append((text, portrait, dhash(image), thumbnail(image)))
+
+    copies = copies_matched = signs = by_hash = confirmed = 0
+    for (text, portrait, photo_hash, pixels), other in combinations(photos, 2):
+        close = distance(photo_hash, other[2]) <= HASH_MAX_DISTANCE
+        matched = close and same_photo(pixels, other[3])
+        if text != other[0]:
+            signs += 1
+            by_hash += close
+            confirmed += matched
+        elif portrait == other[1]:
+            copies += 1
+            copies_matched += matched
+
+    console.print(
+        f"[grey70]photo matches: {copies_matched}/{copies} copies of a sign, "
+        f"different signs {by_hash}/{signs} ({by_hash / signs:.1%}) by hash, "
+        f"{confirmed}/{signs} ({confirmed / signs:.1%}) once confirmed by thumbnail[/]"
+    )
+
+
+def bench_startup(runs: int) -> BenchResult:
+    """Time importing the CLI in fresh interpreters, as `python -m placefinder` does"""
+    script = (
+        "import json, sys, time; start = time.perf_counter(); "
+        "import placefinder.__main__; "
+        "print(json.dumps([time.perf_counter() - start, "
+        f"[m for m in {HEAVY_MODULES!r} if m in sys.modules]]))"
+    )
+    environ = os.environ | {"PYTHONPATH": str(Path(__file__).parents[1])}
+    heavy: set[str] = set()
+
+    def start() -> list[float]:
+        latencies = []
+        # The CLI creates its databases in the working directory
+        with tempfile.TemporaryDirectory() as cwd:
+            for _ in range(runs):
+                output = subprocess.run(
+                    [sys.executable, "-c", script],
+                    cwd=cwd,
+                    env=environ,
+                    capture_output=True,
+                    check=True,
+                    text=True,
+                ).stdout
+                seconds, loaded = json.loads(output)
+                latencies.append(seconds)
+                heavy.update(loaded)
+        return latencies
+
+    result = measure("startup", runs, start, memory=False)
+
+    if heavy:
+        console.print(
+            f"[red]Startup imports heavy modules: {', '.join(sorted(heavy))}[/]"
+        )
+
+    return result
+
+
+def report(results: list[BenchResult]) -> None:
+    table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    table.add_column("Benchmark", no_wrap=True)
+    table.add_column("Size", justify="right")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Items/s", justify="right")
+    table.add_column("p50 ms", justify="right")
+    table.add_column("p95 ms", justify="right")
+    table.add_column("p99 ms", justify="right")
+    table.add_column("Peak MB", justify="right")
+
+    def fmt(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.2f}"
+
+    for result in results:
+        table.add_row(
+            result.name,
+            str(result.size),
+            f"{result.seconds:.3f}",
+            f"{result.throughput:,.0f}",
+            fmt(result.p50_ms),
+            fmt(result.p95_ms),
+            fmt(result.p99_ms),
+            fmt(result.peak_mb),
+        )
+
+    console.print(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--crawl-sizes", type=int, nargs="*", default=[1000, 10000])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--token-delay", type=float, default=0.0, help="seconds, Google's is ~2"
+    )
+    parser.add_argument("--ocr", type=int, default=0, help="places analyzed, 0 to skip")
+    parser.add_argument("--ocr-photos", type=int, default=None)
+    parser.add_argument(
+        "--ocr-text-rate", type=float, default=0.5, help="share of photos with text"
+    )
+    parser.add_argument(
+        "--ocr-portrait-rate",
+        type=float,
+        default=0.0,
+        help="share of photos taller than wide",
+    )
+    parser.add_argument("--ocr-batch", type=int, nargs="*", default=[1, 8])
+    parser.add_argument(
+        "--ocr-hashes", action="store_true", help="also reuse near-identical photos"
+    )
+    parser.add_argument("--startup", type=int, default=10, help="runs, 0 to skip")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    memory = not args.no_memory
+    results: list[BenchResult] = []
+
+    if args.startup:
+        results.append(bench_startup(args.startup))
+
+    for size in args.sizes:
+        results.append(bench_sanitize(size, memory))
+        results.append(bench_store(size, memory))
+        results.extend(bench_collection(size, memory))
+        results.extend(bench_spatial(size, memory))
+        if memory:
+            results.extend(bench_collection_memory(size))
+
+    for size in args.crawl_sizes:
+        results.append(
+            bench_crawl(size, args.latency, args.error_rate, args.token_delay, memory)
+        )
+
+    if args.ocr and args.ocr_hashes:
+        bench_photo_matches()
+
+    # Terms found per place, by batch size, batches should find the same as 1
+    ocr_terms: dict[int, dict[str, list[str]]] = {}
+    for batch_size in args.ocr_batch if args.ocr else []:
+        for hashes in (False, True) if args.ocr_hashes else (False,):
+            ocr = bench_ocr(
+                args.ocr,
+                args.ocr_photos or args.ocr,
+                args.ocr_text_rate,
+                args.ocr_portrait_rate,
+                batch_size,
+                hashes,
+                memory,
+                None if hashes else ocr_terms.setdefault(batch_size, {}),
+            )
+            if ocr:
+                results.append(ocr)
+
+    single = ocr_terms.get(1)
+    for batch_size, found in ocr_terms.items():
+        if single and found and batch_size != 1:
+            same = sum(found[place_id] == terms for place_id, terms in single.items())
+            console.print(
+                f"[grey70]ocr batch {batch_size}: terms of {same}/{len(single)} "
+                "places match those recognized one by one[/]"
+            )
+
+    report(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(
+                "[" + ",".join(result.model_dump_json() for result in results) + "]"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""Local stand-in for the Google Maps endpoints used by placefinder
+
+Serves geocoding, nearby search (with next_page_token), place details and place
+photos over a synthetic world of places, with configurable latency and error rate.
+Like Google's, a next_page_token is only valid after `token_delay` seconds.
+Point placefinder at it with GMAPS_BASE_URL:
+
+    uv run -m benchmarks.server --places 10000 --port 8765
+    GMAPS_BASE_URL=http://127.0.0.1:8765 uv run -m placefinder
+"""
+
+import argparse
+import base64
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+CENTER = {"lat": 48.8566, "lng": 2.3522}
+RADIUS = 10000
+KEYWORDS = ["bubble tea", "ramen", "kebab", "korean", "cider"]
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+METERS_PER_DEGREE = 111_320
+# Width and height of the landscape photos, portrait ones are the other way round
+PHOTO_SIZE = (800, 600)
+
+
+class World:
+    """Synthetic places spread uniformly over a disc"""
+
+    def __init__(
+        self,
+        places: int,
+        center: dict = CENTER,
+        radius: int = RADIUS,
+        photos: Optional[int] = None,
+        seed: int = 0,
+        portrait_rate: float = 0.0,
+    ):
+        """
+        Args:
+            places (int): Number of places
+            center (dict, optional): Center of the disc, as {"lat": ..., "lng": ...}
+            radius (int, optional): Radius of the disc in meters
+            photos (int, optional): Distinct photos shared by the places, one per place when None
+            seed (int, optional): Random seed, the same seed gives the same world
+            portrait_rate (float, optional): Share of the photos taller than wide
+        """
+        rng = np.random.default_rng(seed)
+
+        self.size = places
+        self.center = center
+        self.photos = photos or places
+        self.portrait_rate = portrait_rate
+
+        distance = radius * np.sqrt(rng.random(places))
+        angle = rng.random(places) * 2 * math.pi
+        self.y = distance * np.sin(angle)
+        self.x = distance * np.cos(angle)
+        self.lat = center["lat"] + self.y / METERS_PER_DEGREE
+        self.lng = center["lng"] + self.x / (
+            METERS_PER_DEGREE * math.cos(math.radians(center["lat"]))
+        )
+        self.rating = np.round(rng.uniform(1, 5, places), 1)
+        self.total_ratings = rng.integers(0, 2000, places)
+        self.keyword = rng.integers(0, len(KEYWORDS), places)
+        # Nearby search results are sorted by prominence
+        self.prominence = rng.permutation(places)
+
+    def portrait(self, photo: int) -> bool:
+        """Whether a photo is taller than wide"""
+        return (photo * 0.414214) % 1 < self.portrait_rate
+
+    def place(self, i: int) -> dict:
+        width, height = (
+            PHOTO_SIZE[::-1] if self.portrait(i % self.photos) else PHOTO_SIZE
+        )
+        district = 1 + int(abs(self.x[i] + self.y[i])) % 20
+        return {
+            "place_id": f"fake-{i}",
+            "name": f"Place {i}",
+            "vicinity": f"{i} Rue Synthétique, Paris",
+            "formatted_address": f"{i} Rue Synthétique, 750{district:02d} Paris, France",
+            "rating": float(self.rating[i]),
+            "user_ratings_total": int(self.total_ratings[i]),
+            "geometry": {
+                "location": {"lat": float(self.lat[i]), "lng": float(self.lng[i])}
+            },
+            "photos": [
+                {
+                    "height": height,
+                    "width": width,
+                    "photo_reference": f"photo-{i % self.photos}",
+                    "html_attributions": [],
+                }
+            ],
+        }
+
+    def nearby(self, lat: float, lng: float, radius: float, keyword: str) -> np.ndarray:
+        """Indexes of the places of a search, by prominence"""
+        dy = (self.lat - lat) * METERS_PER_DEGREE
+        dx = (self.lng - lng) * METERS_PER_DEGREE * math.cos(math.radians(lat))
+        mask = dx * dx + dy * dy <= radius * radius
+
+        keyword = " ".join(keyword.lower().split())
+        if keyword in KEYWORDS:
+            mask &= self.keyword == KEYWORDS.index(keyword)
+
+        found = np.flatnonzero(mask)
+        return found[np.argsort(self.prominence[found])][:MAX_RESULTS]
+
+
+# JPEG qualities of the copies of a photo, the same sign uploaded several times
+PHOTO_QUALITIES = (95, 90, 85, 80)
+# Texts of the signs, some a letter apart, which perceptual hashes barely tell apart
+SIGN_TEXTS = (
+    "BUBBLE TEA",
+    "BUBBLE TEE",
+    "BUBBLE TEAS",
+    "BOBA TEA",
+    "MATCHA",
+    "PIZZA",
+    "KEBAB",
+    "RAMEN",
+)
+
+
+def photo_bytes(text: str, quality: int = 95, portrait: bool = False) -> bytes:
+    """JPEG of a storefront-like sign holding `text`"""
+    width, height = PHOTO_SIZE[::-1] if portrait else PHOTO_SIZE
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(
+        image, text, (40, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4
+    )
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+class FakeMapsServer:
+    """Serve a World in a background thread
+
+    Usable as a context manager, `base_url` is set once started.
+    """
+
+    def __init__(
+        self,
+        world: World,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token_delay: float = 0.0,
+        text_rate: float = 1.0,
+    ):
+        """
+        Args:
+            world (World): Places served
+            latency (float, optional): Seconds added to every response
+            error_rate (float, optional): Share of requests answered with a 500 error
+            host (str, optional)
+            port (int, optional): 0 picks a free port
+            token_delay (float, optional): Seconds before a next_page_token is valid,
+                it is answered with INVALID_REQUEST before
+            text_rate (float, optional): Share of the photos showing a sign, the
+                others show no text at all. Signs hold one of SIGN_TEXTS, and are
+                served as copies encoded differently, looking the same but with
+                different bytes
+        """
+        self.world = world
+        self.latency = latency
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.text_rate = text_rate
+        # Landscape and portrait copies of the signs, by text then quality
+        self.photos = {
+            portrait: [
+                photo_bytes(text, quality, portrait)
+                for text in SIGN_TEXTS
+                for quality in PHOTO_QUALITIES
+            ]
+            for portrait in (False, True)
+        }
+        self.blank_photos = {
+            portrait: photo_bytes("", portrait=portrait) for portrait in (False, True)
+        }
+        self.requests: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        setattr(self.httpd, "fake", self)
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def sign_text(self, photo: int) -> str:
+        """Text of the sign a photo shows, empty when it shows no text"""
+        if (photo * 0.618034) % 1 < self.text_rate:
+            return SIGN_TEXTS[photo % len(self.photos[False]) // len(PHOTO_QUALITIES)]
+        return ""
+
+    def photo_for(self, params: dict) -> bytes:
+        # The same reference always gets the same photo
+        i = int(params["photoreference"].removeprefix("photo-"))
+        portrait = self.world.portrait(i)
+        if self.sign_text(i):
+            photos = self.photos[portrait]
+            return photos[i % len(photos)]
+        return self.blank_photos[portrait]
+
+    def __enter__(self) -> "FakeMapsServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, endpoint: str) -> None:
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def geocode(self, params: dict) -> dict:
+        return {
+            "status": "OK",
+            "results": [{"geometry": {"location": self.world.center}}],
+        }
+
+    def nearby(self, params: dict) -> dict:
+        if "pagetoken" in params:
+            query = json.loads(base64.urlsafe_b64decode(params["pagetoken"]))
+            if time.time() - query["issued_at"] < self.token_delay:
+                return {"status": "INVALID_REQUEST", "results": []}
+        else:
+            lat, lng = map(float, params["location"].split(","))
+            query = {
+                "lat": lat,
+                "lng": lng,
+                "radius": float(params.get("radius", RADIUS)),
+                "keyword": params.get("keyword", ""),
+                "offset": 0,
+            }
+
+        found = self.world.nearby(
+            query["lat"], query["lng"], query["radius"], query["keyword"]
+        )
+        offset = query["offset"]
+        page = found[offset : offset + PAGE_SIZE]
+
+        body: dict = {
+            "status": "OK" if len(page) else "ZERO_RESULTS",
+            "results": [self.world.place(int(i)) for i in page],
+        }
+
+        if offset + PAGE_SIZE < len(found):
+            query["offset"] = offset + PAGE_SIZE
+            query["issued_at"] = time.time()
+            body["next_page_token"] = base64.urlsafe_b64encode(
+                json.dumps(query).encode()
+            ).decode()
+
+        return body
+
+    def details(self, params: dict) -> dict:
+        i = int(params["placeid"].removeprefix("fake-"))
+        if not 0 <= i < self.world.size:
+            return {"status": "NOT_FOUND"}
+
+        place = self.world.place(i)
+        fields = params.get("fields", "").split(",")
+        if "photo" in fields:
+            fields.append("photos")
+
+        return {
+            "status": "OK",
+            "result": {key: value for key, value in place.items() if key in fields},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let them wait on each other
+    disable_nagle_algorithm = True
+
+    routes = {
+        "/maps/api/geocode/json": "geocode",
+        "/maps/api/place/nearbysearch/json": "nearby",
+        "/maps/api/place/details/json": "details",
+        "/maps/api/place/photo": "photo",
+    }
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        fake: FakeMapsServer = getattr(self.server, "fake")
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = self.routes.get(url.path)
+
+        if endpoint is None:
+            self._send(404, b"", "text/plain")
+            return
+
+        fake.count(endpoint)
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        if random.random() < fake.error_rate:
+            self._send(500, b"", "text/plain")
+            return
+
+        if endpoint == "photo":
+            self._send(200, fake.photo_for(params), "image/jpeg")
+            return
+
+        body = json.dumps(getattr(fake, endpoint)(params)).encode()
+        self._send(200, body, "application/json")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--places", type=int, default=10000)
+    parser.add_argument("--photos", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=2.0)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    world = World(args.places, photos=args.photos)
+    with FakeMapsServer(
+        world, args.latency, args.error_rate, args.host, args.port, args.token_delay
+    ) as server:
+        print(f"Serving {args.places} places on {server.base_url}")
+        server.thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,78 @@ PARIS = Location(
         "75020",
     ],
     radius=10000,
+    # Centroids of the built-up part of each arrondissement, the Bois de Boulogne
+    # and the Bois de Vincennes left out so they do not pull the 16th and 12th away
+    district_centroids={
+        "75001": (48.8625, 2.3364),
+        "75002": (48.8683, 2.3428),
+        "75003": (48.8630, 2.3600),
+        "75004": (48.8543, 2.3576),
+        "75005": (48.8445, 2.3507),
+        "75006": (48.8491, 2.3329),
+        "75007": (48.8562, 2.3122),
+        "75008": (48.8727, 2.3125),
+        "75009": (48.8771, 2.3375),
+        "75010": (48.8761, 2.3608),
+        "75011": (48.8591, 2.3801),
+        "75012": (48.8396, 2.3876),
+        "75013": (48.8283, 2.3623),
+        "75014": (48.8292, 2.3266),
+        "75015": (48.8401, 2.2930),
+        "75016": (48.8600, 2.2700),
+        "75017": (48.8874, 2.3067),
+        "75018": (48.8925, 2.3484),
+        "75019": (48.8871, 2.3848),
+        "75020": (48.8634, 2.4012),
+    },
+    # The 16th also has the postal code of its northern half
+    district_aliases={"75116": "75016"},
+    # City limits, approximated to a few hundred meters: along the Boulevard
+    # Peripherique from the Porte Maillot clockwise, around the Bois de Vincennes,
+    # then around the Bois de Boulogne
+    boundary=[
+        (48.8790, 2.2800),
+        (48.8870, 2.2895),
+        (48.8915, 2.2995),
+        (48.8965, 2.3110),
+        (48.8995, 2.3290),
+        (48.9015, 2.3440),
+        (48.9010, 2.3595),
+        (48.9005, 2.3700),
+        (48.8990, 2.3880),
+        (48.8900, 2.3990),
+        (48.8780, 2.4110),
+        (48.8650, 2.4150),
+        (48.8535, 2.4160),
+        (48.8470, 2.4120),
+        (48.8400, 2.4130),
+        (48.8400, 2.4250),
+        (48.8405, 2.4330),
+        (48.8425, 2.4480),
+        (48.8420, 2.4650),
+        (48.8345, 2.4730),
+        (48.8250, 2.4620),
+        (48.8215, 2.4410),
+        (48.8255, 2.4140),
+        (48.8230, 2.3960),
+        (48.8195, 2.3700),
+        (48.8175, 2.3600),
+        (48.8160, 2.3440),
+        (48.8185, 2.3250),
+        (48.8240, 2.3050),
+        (48.8285, 2.2880),
+        (48.8310, 2.2750),
+        (48.8345, 2.2620),
+        (48.8365, 2.2540),
+        (48.8440, 2.2510),
+        (48.8455, 2.2380),
+        (48.8530, 2.2260),
+        (48.8640, 2.2235),
+        (48.8735, 2.2300),
+        (48.8800, 2.2440),
+        (48.8800, 2.2600),
+    ],
+    district_label="Arrondissement",
 )
 
 locations: dict[str, Location] = {"fr-paris": PARIS}
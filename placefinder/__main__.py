@@ -4,14 +4,53 @@ from rich.panel import Panel
 from rich.text import Text
 
 from placefinder import console
+from placefinder.cache import Cache
+from placefinder.dedupe import find_duplicates
+from placefinder.districts import DistrictIndex
 from placefinder.Locations import locations
-from placefinder.ocr.VisualAnalyzer import VisualAnalyzer
-from placefinder.services.GMaps import GMapsService
-from placefinder.summary import top_places
+from placefinder.metrics import metrics
+from placefinder.planner import MIN_NOVELTY, QueryPlanner, SearchPlanner
+from placefinder.quota import USAGE_PATH, RequestScheduler
+from placefinder.services.GMaps import (
+    CACHE_TTLS,
+    FULL_ADDRESS_POLICY,
+    PRICES,
+    QUOTAS,
+    GMapsService,
+)
+from placefinder.store import PlaceStore
+from placefinder.summary import (
+    density_hotspots,
+    district_distribution,
+    duplicate_groups,
+    live_summary,
+    query_novelty,
+    run_metrics,
+    search_plan,
+    top_places,
+)
 from placefinder.t import Location, PlaceCollection
 from placefinder.terminal import Banner, ProgressBar, WorkingOnIt
 
 OCR = False
+CACHE = True
+# Keep places across runs, only fetching new or stale ones
+STORE = True
+# Request the full address of every new place, a place details request each,
+# rather than the nearby search one without postal code
+FULL_ADDRESS = False
+# Search tiles of the location instead of one "term district" query per district
+TILING = True
+# Share of new places under which a query stops paginating, None to always paginate
+QUERY_MIN_NOVELTY = MIN_NOVELTY
+# Only report the requests a search would send
+DRY_RUN = False
+# Keep places as columns rather than objects, for searches finding a lot of places
+COMPACT = False
+# Top places shown while searching
+LIVE_TOP = 10
+# Request metrics of the run are written to <METRICS_PATH>.json and .prom
+METRICS_PATH = "data/metrics"
 
 location = locations["fr-paris"]
 
@@ -38,42 +77,85 @@ base_terms = ["bubble tea", "bubble tea shop"]
 
 search_terms = []
 
-for term in base_terms:
-    for district in location.districts[:1]:
-        search_terms.append(f"{term} {district}")
+if TILING:
+    search_terms = base_terms
+else:
+    for term in base_terms:
+        for district in location.districts[:1]:
+            search_terms.append(f"{term} {district}")
 
+planner = SearchPlanner() if TILING else None
+query_planner = (
+    QueryPlanner(min_novelty=QUERY_MIN_NOVELTY)
+    if QUERY_MIN_NOVELTY is not None
+    else None
+)
 
-def search_places(location: Location, search_terms: List[str]) -> PlaceCollection:
+
+def search_places(
+    location: Location, search_terms: List[str], scheduler: RequestScheduler
+) -> PlaceCollection:
     """
     Fetches places in specified location using Google Maps Places API
     """
-    collection = PlaceCollection()
+    collection = PlaceCollection(
+        compact=COMPACT, districts=DistrictIndex.from_locations([location])
+    )
 
-    gmaps = GMapsService()
+    cache = Cache(ttls=CACHE_TTLS) if CACHE else None
+    store = PlaceStore() if STORE else None
+    gmaps = GMapsService(
+        cache=cache,
+        store=store,
+        scheduler=scheduler,
+        details_policy=FULL_ADDRESS_POLICY if FULL_ADDRESS else None,
+    )
 
     if OCR:
         with WorkingOnIt("[bold blue]Initializing OCR engine...[/]"):
-            visual_analyzer = VisualAnalyzer(languages=["en", "fr"])
+            # Imported here, the OCR stack (EasyOCR, Torch, OpenCV) takes seconds to load
+            from placefinder.ocr.hashes import PhotoHashIndex
+            from placefinder.ocr.VisualAnalyzer import VisualAnalyzer
+
+            visual_analyzer = VisualAnalyzer(
+                languages=["en", "fr"],
+                cache=cache,
+                hashes=PhotoHashIndex() if CACHE else None,
+            )
+
+    progress = ProgressBar()
+
+    # Places are streamed, so OCR and the summary start with the first one found
+    places = gmaps.iter_places(
+        str(location),
+        search_terms,
+        radius=location.radius,
+        planner=planner,
+        progress=progress,
+        query_planner=query_planner,
+    )
 
-    places = gmaps.get_places(str(location), search_terms, radius=location.radius)
+    if OCR:
+        analyzed = visual_analyzer.analyze_places(places)
+    else:
+        analyzed = ((place, []) for place in places)
 
-    with ProgressBar() as progress:
-        task = progress.add_task(
-            description="[yellow]Parsing places ...", total=len(places)
-        )
+    # Places whose photos revealed new menu terms, saved back to the store
+    enriched = []
 
-        for place in places:
-            if OCR and place.photos:
-                progress.update(
-                    task,
-                    description=f"[cyan]Analyzing {place.name}'s photos ...",
-                )
-                found_words = visual_analyzer.analyze_place_photos(place.photos)
-                print(found_words)
+    with live_summary(collection, progress, LIVE_TOP):
+        for place, found_words in analyzed:
+            if set(found_words) - set(place.menu_terms):
+                place.menu_terms = sorted({*place.menu_terms, *found_words})
+                enriched.append(place)
 
             collection.add_place(place)
 
-            progress.update(task, advance=1)
+    if OCR:
+        visual_analyzer.close()
+
+    if store is not None:
+        store.update_many(enriched)
 
     return collection
 
@@ -81,7 +163,14 @@ def search_places(location: Location, search_terms: List[str]) -> PlaceCollectio
 def main():
     Banner("🔍 Places Finder 🔍", "Powered by Google Maps API")
 
-    collection = search_places(location, search_terms)
+    # Built here, it opens the usage database, which importing must not create
+    scheduler = RequestScheduler(QUOTAS, PRICES, path=USAGE_PATH)
+
+    if DRY_RUN:
+        search_plan(str(location), search_terms, planner, location.radius, scheduler)
+        return
+
+    collection = search_places(location, search_terms, scheduler)
 
     # location_slug = location.lower().replace(",", "").replace(" ", "_")
     # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -100,6 +189,16 @@ def main():
     console.print(f"[bold cyan]Total places found:[/] [yellow]{total_places}[/]")
 
     top_places(collection, total_places)
+    district_distribution(collection, location)
+    density_hotspots(collection)
+    duplicate_groups(find_duplicates(collection))
+
+    if query_planner is not None:
+        query_novelty(query_planner)
+
+    run_metrics(metrics)
+    if METRICS_PATH:
+        metrics.write(METRICS_PATH)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,241 @@
+"""Run many searches at once, e.g. nightly across cities
+
+    uv run -m placefinder.batch jobs.json --workers 4
+
+The job spec is a JSON file of jobs, each searching term sets in locations:
+
+    {"jobs": [{"name": "bubble-tea", "locations": ["fr-paris"],
+               "term_sets": [["bubble tea", "bubble tea shop"]]}]}
+
+Each location and term set is searched by its own process. Processes share the rate
+limit, the response cache, the place store and the quotas through SQLite, and
+the places of a job are merged into one deduplicated collection.
+"""
+
+import argparse
+import json
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+from rich.progress import Progress
+
+from placefinder import console, error_console
+from placefinder.cache import Cache
+from placefinder.dedupe import find_duplicates
+from placefinder.districts import DistrictIndex
+from placefinder.Locations import locations, supported_locations
+from placefinder.metrics import Metrics, metrics
+from placefinder.planner import QueryPlanner, SearchPlanner
+from placefinder.quota import USAGE_PATH, RequestScheduler
+from placefinder.ratelimit import SharedRateLimiter
+from placefinder.services.GMaps import (
+    CACHE_TTLS,
+    PRICES,
+    QUERIES_PER_SECOND,
+    QUOTAS,
+    GMapsService,
+)
+from placefinder.store import PlaceStore
+from placefinder.summary import run_metrics
+from placefinder.t import BatchShard, JobSpec, Place, PlaceCollection
+from placefinder.terminal import ProgressBar
+
+# Processes searching at once
+BATCH_WORKERS = 4
+# Collections of the jobs are written to <BATCH_PATH>/<job name>.json
+BATCH_PATH = "data/batch"
+
+
+def plan_shards(spec: JobSpec) -> list[BatchShard]:
+    """Split jobs into one shard per location and term set
+
+    Raises:
+        ValueError: if a job refers to an unknown location
+    """
+    shards = []
+
+    for job in spec.jobs:
+        for key in job.locations:
+            if key not in locations:
+                raise ValueError(
+                    f"Unknown location {key!r} in job {job.name!r}, "
+                    f"supported: {', '.join(supported_locations)}"
+                )
+
+            location = locations[key]
+
+            for term_set in job.term_sets:
+                terms = QueryPlanner.dedupe(term_set)
+                if not terms:
+                    continue
+
+                shards.append(
+                    BatchShard(
+                        job=job.name,
+                        location=key,
+                        terms=terms
+                        if job.tiling
+                        else [
+                            f"{term} {district}"
+                            for term in terms
+                            for district in location.districts
+                        ],
+                        tiling=job.tiling,
+                    )
+                )
+
+    return shards
+
+
+def _init_worker() -> None:
+    # Workers report through the parent, their own output would garble its progress
+    console.quiet = True
+
+
+@cache
+def _service(queries_per_second: float) -> GMapsService:
+    """Service of a worker process, reused by the shards it runs"""
+    return GMapsService(
+        cache=Cache(ttls=CACHE_TTLS),
+        rate_limiter=SharedRateLimiter(queries_per_second),
+        store=PlaceStore(),
+        scheduler=RequestScheduler(QUOTAS, PRICES, path=USAGE_PATH),
+    )
+
+
+def run_shard(shard: BatchShard, queries_per_second: float) -> tuple[list[Place], dict]:
+    """Search a shard, in a worker process
+
+    Returns:
+        tuple[list[Place], dict]: Places found, and the metrics of the shard
+    """
+    gmaps = _service(queries_per_second)
+    gmaps.metrics = Metrics()
+
+    location = locations[shard.location]
+    places = list(
+        gmaps.iter_places(
+            str(location),
+            shard.terms,
+            radius=location.radius,
+            planner=SearchPlanner() if shard.tiling else None,
+            progress=Progress(disable=True),
+            query_planner=QueryPlanner(),
+        )
+    )
+
+    return places, gmaps.metrics.to_dict()
+
+
+def run_batch(
+    spec: JobSpec,
+    workers: int = BATCH_WORKERS,
+    queries_per_second: float = QUERIES_PER_SECOND,
+    compact: bool = False,
+) -> dict[str, PlaceCollection]:
+    """Search every job of a spec across a process pool
+
+    Shards failing are reported and skipped, the other ones still complete.
+
+    Args:
+        spec (JobSpec)
+        workers (int, optional): Processes searching at once
+        queries_per_second (float, optional): Rate limit of all processes combined
+        compact (bool, optional): Build compact collections, see PlaceCollection
+
+    Returns:
+        dict[str, PlaceCollection]: Places found per job name
+    """
+    shards = plan_shards(spec)
+    results: list[Optional[list[Place]]] = [None] * len(shards)
+
+    with (
+        ProgressBar() as progress,
+        ProcessPoolExecutor(
+            max_workers=workers,
+            # Workers must not inherit the SQLite connections of the parent
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        ) as pool,
+    ):
+        task = progress.add_task("[yellow]Running batch ...", total=len(shards))
+
+        futures: dict[Future, int] = {
+            pool.submit(run_shard, shard, queries_per_second): i
+            for i, shard in enumerate(shards)
+        }
+
+        for future in as_completed(futures):
+            i = futures[future]
+            shard = shards[i]
+
+            try:
+                places, shard_metrics = future.result()
+            except Exception as e:
+                error_console.print(
+                    f"[red]{shard.job}: {shard.location} {shard.terms} failed: {e}[/]"
+                )
+            else:
+                results[i] = places
+                metrics.merge(shard_metrics)
+
+            progress.update(task, advance=1)
+
+    # Merged in shard order, so reruns give the same collections
+    collections = {
+        job.name: PlaceCollection(
+            compact,
+            DistrictIndex.from_locations(locations[key] for key in job.locations),
+        )
+        for job in spec.jobs
+    }
+    for shard, places in zip(shards, results):
+        for place in places or []:
+            collections[shard.job].add_place(place)
+
+    return collections
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", help="JSON job spec")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--qps", type=float, default=QUERIES_PER_SECOND)
+    parser.add_argument("--output", default=BATCH_PATH)
+    parser.add_argument(
+        "--compact", action="store_true", help="use less memory for large jobs"
+    )
+    args = parser.parse_args()
+
+    spec = JobSpec.model_validate_json(Path(args.spec).read_text())
+    collections = run_batch(spec, args.workers, args.qps, args.compact)
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+
+    for name, collection in collections.items():
+        path = output / f"{name}.json"
+        path.write_text(json.dumps(collection.to_list(), ensure_ascii=False))
+
+        # Reported for review rather than merged, as some are distinct places
+        duplicates = find_duplicates(collection)
+        duplicates_path = output / f"{name}.duplicates.json"
+        duplicates_path.write_text(
+            json.dumps([group.model_dump() for group in duplicates], ensure_ascii=False)
+        )
+
+        console.print(
+            f"[bold cyan]{name}:[/] [yellow]{len(collection)}[/] places in {path}, "
+            f"[yellow]{len(duplicates)}[/] groups of probable duplicates in "
+            f"{duplicates_path}"
+        )
+
+    run_metrics(metrics)
+    metrics.write(str(output / "metrics"))
+
+
+if __name__ == "__main__":
+    main()
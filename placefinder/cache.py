@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+CACHE_PATH = ".cache/placefinder.sqlite"
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def make_key(**params: Any) -> str:
+    """Build a stable cache key from (already normalized) request arguments
+
+    Args:
+        **params: Request arguments, order does not matter
+    """
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Cache:
+    """Persistent key/value store backed by SQLite
+
+    Entries are grouped by namespace (usually one per API endpoint), each namespace
+    having its own time to live. When the store grows over `max_bytes`, the least
+    recently used entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttls: Optional[dict[str, Optional[float]]] = None,
+        max_bytes: int = CACHE_MAX_BYTES,
+    ):
+        """
+        Args:
+            path (str): SQLite database file, created if missing
+            ttls (dict[str, float | None], optional): Time to live in seconds per namespace,
+                None meaning forever. Namespaces not listed never expire.
+            max_bytes (int, optional): Size above which entries are evicted
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.ttls = ttls or {}
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Batch worker processes share the file, wait for their writes
+        self.conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self.size = self._total_size()
+
+    def _total_size(self) -> int:
+        row = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return int(row[0])
+
+    def _expired(self, namespace: str, created_at: float, now: float) -> bool:
+        ttl = self.ttls.get(namespace)
+        return ttl is not None and now - created_at > ttl
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a cached value, None if it is missing or expired"""
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            value, created_at = row
+
+            if self._expired(namespace, created_at, now):
+                self.conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                )
+                self.size = self._total_size()
+                return None
+
+            self.conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Store a JSON serializable value"""
+        now = time.time()
+        data = json.dumps(value, separators=(",", ":"))
+
+        with self.lock:
+            # A replaced entry no longer counts
+            row = self.conn.execute(
+                "SELECT size FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            self.conn.execute(
+                """
+                INSERT INTO entries (namespace, key, value, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (namespace, key) DO UPDATE SET
+                    value = excluded.value,
+                    size = excluded.size,
+                    created_at = excluded.created_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (namespace, key, data, len(data), now, now),
+            )
+            self.size += len(data) - (row[0] if row else 0)
+
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        now = time.time()
+
+        for namespace, ttl in self.ttls.items():
+            if ttl is not None:
+                self.conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND created_at < ?",
+                    (namespace, now - ttl),
+                )
+
+        self.size = self._total_size()
+
+        while self.size > self.max_bytes:
+            # Evict a batch at a time rather than row by row
+            self.conn.execute(
+                """
+                DELETE FROM entries WHERE rowid IN (
+                    SELECT rowid FROM entries ORDER BY accessed_at LIMIT 100
+                )
+                """
+            )
+            self.size = self._total_size()
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Remove every entry, or only those of a namespace"""
+        with self.lock:
+            if namespace is None:
+                self.conn.execute("DELETE FROM entries")
+            else:
+                self.conn.execute(
+                    "DELETE FROM entries WHERE namespace = ?", (namespace,)
+                )
+            self.size = self._total_size()
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,232 @@
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from placefinder.districts import DistrictIndex
+from placefinder.planner import METERS_PER_DEGREE
+from placefinder.t import RATING_BUCKETS, Place
+
+# Lower bounds of the rating buckets, from "Below Average" to "Excellent"
+RATING_EDGES = np.array([3.0, 3.5, 4.0, 4.5])
+
+INITIAL_CAPACITY = 1024
+# Places compared to every district centroid at once, bounds the distance matrix
+DISTRICT_CHUNK_SIZE = 65_536
+
+
+def contains(
+    polygon: list[tuple[float, float]], latitude: np.ndarray, longitude: np.ndarray
+) -> np.ndarray:
+    """Vectorized placefinder.districts.contains"""
+    inside = np.zeros(len(latitude), dtype=bool)
+
+    for (lat, lng), (next_lat, next_lng) in zip(polygon, polygon[1:] + polygon[:1]):
+        if lat == next_lat:
+            continue
+        crosses = (lat > latitude) != (next_lat > latitude)
+        crossing = lng + (latitude - lat) * (next_lng - lng) / (next_lat - lat)
+        inside ^= crosses & (longitude < crossing)
+
+    return inside
+
+
+def locate_districts(
+    districts: DistrictIndex,
+    latitude: np.ndarray,
+    longitude: np.ndarray,
+    addresses: Optional[Sequence[str]] = None,
+) -> np.ndarray:
+    """Vectorized DistrictIndex.locate, -1 for places in no district"""
+    located = np.full(len(latitude), -1, dtype=np.int16)
+    if not len(districts):
+        return located
+
+    latitudes = np.array(districts.latitudes)
+    longitudes = np.array(districts.longitudes)
+    scales = np.array(districts.scales)
+    boundary = np.array(districts.boundary)
+
+    for start in range(0, len(latitude), DISTRICT_CHUNK_SIZE):
+        end = start + DISTRICT_CHUNK_SIZE
+        lat, lng = latitude[start:end], longitude[start:end]
+        # One row per place, one column per district
+        dy = (lat[:, None] - latitudes) * METERS_PER_DEGREE
+        dx = (lng[:, None] - longitudes) * scales
+        distances = dx * dx + dy * dy
+
+        nearest = distances.argmin(axis=1)
+        outlines = boundary[nearest]
+        within = (outlines < 0) & (
+            distances[np.arange(len(nearest)), nearest] < districts.max_distance**2
+        )
+        for i, polygon in enumerate(districts.boundaries):
+            rows = np.flatnonzero(outlines == i)
+            within[rows] = contains(polygon, lat[rows], lng[rows])
+
+        located[start:end] = np.where(within, nearest, -1)
+
+    # Postal codes first, as DistrictIndex.locate does
+    if addresses is not None and districts.postal_codes:
+        for i, address in enumerate(addresses):
+            by_code = districts.locate_address(address) if address else None
+            if by_code is not None:
+                located[i] = by_code
+
+    return located
+
+
+class ColumnarPlaces:
+    """Columnar view of places, one NumPy array per field
+
+    Missing ratings are stored as NaN, missing review counts and districts as -1.
+    Districts are indexes in `districts.names`, located as DistrictIndex.locate does.
+    Rows keep the insertion order of the places they were built from.
+    """
+
+    def __init__(
+        self, places: Iterable[Place] = (), districts: Optional[DistrictIndex] = None
+    ):
+        self.districts = districts
+        self.size = 0
+        self.rating = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.total_ratings = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self.latitude = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.longitude = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self.district = np.empty(INITIAL_CAPACITY, dtype=np.int16)
+
+        self.extend(places)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self, capacity: int) -> None:
+        for name in ("rating", "total_ratings", "latitude", "longitude", "district"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self.size] = column[: self.size]
+            setattr(self, name, grown)
+
+    def extend(self, places: Iterable[Place]) -> None:
+        """Append places as new rows"""
+        rows = [
+            (
+                np.nan if place.rating is None else place.rating,
+                -1 if place.total_ratings is None else place.total_ratings,
+                place.latitude,
+                place.longitude,
+                place.address,
+            )
+            for place in places
+        ]
+
+        if not rows:
+            return
+
+        end = self.size + len(rows)
+        if end > len(self.rating):
+            self._grow(max(end, 2 * len(self.rating)))
+
+        rating, total_ratings, latitude, longitude, addresses = zip(*rows)
+        self.rating[self.size : end] = rating
+        self.total_ratings[self.size : end] = total_ratings
+        self.latitude[self.size : end] = latitude
+        self.longitude[self.size : end] = longitude
+        self.district[self.size : end] = (
+            -1
+            if self.districts is None
+            else locate_districts(
+                self.districts,
+                self.latitude[self.size : end],
+                self.longitude[self.size : end],
+                addresses,
+            )
+        )
+        self.size = end
+
+    def mask(
+        self,
+        min_rating: Optional[float] = None,
+        max_rating: Optional[float] = None,
+        min_total_ratings: Optional[int] = None,
+    ) -> np.ndarray:
+        """Boolean mask of the rows matching every given bound
+
+        Args:
+            min_rating (float, optional): Inclusive lower bound of the rating
+            max_rating (float, optional): Exclusive upper bound of the rating
+            min_total_ratings (int, optional): Inclusive lower bound of the review count
+        """
+        rating = self.rating[: self.size]
+        mask = np.ones(self.size, dtype=bool)
+
+        if min_rating is not None:
+            mask &= rating >= min_rating
+        if max_rating is not None:
+            mask &= rating < max_rating
+        if min_total_ratings is not None:
+            mask &= self.total_ratings[: self.size] >= min_total_ratings
+
+        return mask
+
+    def trusted(self) -> np.ndarray:
+        """Mask of places rated below 4.9 with at least 20 reviews"""
+        return self.mask(min_rating=0, max_rating=4.9, min_total_ratings=20)
+
+    def top_rated(self, n: int = 5, exclude_suspicious: bool = True) -> np.ndarray:
+        """Row indexes of the N best rated places
+
+        Only the N best candidates are sorted. Ties keep insertion order, as in
+        PlaceCollection.get_top_rated.
+        """
+        candidates = (
+            np.flatnonzero(self.trusted())
+            if exclude_suspicious
+            else np.arange(self.size)
+        )
+
+        if n <= 0 or len(candidates) == 0:
+            return candidates[:0]
+
+        ratings = np.nan_to_num(self.rating[candidates], nan=0.0)
+
+        if n < len(candidates):
+            # Every candidate at least as good as the N-th best, ties included
+            threshold = np.partition(ratings, len(ratings) - n)[len(ratings) - n]
+            selected = ratings >= threshold
+            candidates = candidates[selected]
+            ratings = ratings[selected]
+
+        order = np.lexsort((candidates, -ratings))
+        return candidates[order[:n]]
+
+    def rating_distribution(self) -> dict[str, int]:
+        """Get rating distribution counts, labelled as PlaceCollection does"""
+        rating = self.rating[: self.size]
+        rated = rating[~np.isnan(rating)]
+
+        # 0 is "Below Average", 4 is "Excellent"
+        counts = np.bincount(
+            np.searchsorted(RATING_EDGES, rated, side="right"), minlength=5
+        )
+
+        distribution = {
+            label: int(count)
+            for label, count in zip(reversed(RATING_BUCKETS[:5]), counts)
+        }
+        distribution["Not Rated"] = int(self.size - len(rated))
+
+        return {label: distribution[label] for label in RATING_BUCKETS}
+
+    def district_distribution(self) -> dict[str, int]:
+        """Get the number of places per district, as PlaceCollection does"""
+        if self.districts is None:
+            return {}
+
+        district = self.district[: self.size]
+        counts = np.bincount(district[district >= 0], minlength=len(self.districts))
+
+        return {
+            name: int(count)
+            for name, count in zip(self.districts.names, counts)
+            if count
+        }
@@ -0,0 +1,149 @@
+import sys
+from array import array
+from collections.abc import Iterator, Sequence
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional, overload
+
+from placefinder.t import TIMESTAMP_FORMAT, Place, PlacePhoto
+
+# Stands for None in the integer columns
+MISSING = -1
+
+PhotoRow = tuple[int, int, str, tuple[str, ...]]
+
+
+@lru_cache(maxsize=1024)
+def _to_seconds(timestamp: str) -> int:
+    # Places found by a search share their timestamp, so this is mostly cached.
+    # Timestamps are local times, read as UTC so that they round trip across DST.
+    return int(
+        datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+        .replace(tzinfo=timezone.utc)
+        .timestamp()
+    )
+
+
+@lru_cache(maxsize=1024)
+def _to_timestamp(seconds: int) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return None if value is None else sys.intern(value)
+
+
+class CompactPlaces(Sequence[Place]):
+    """Places stored as columns, materialized as Place objects on access only
+
+    Numbers are kept in arrays rather than as Python objects, repeated strings (names
+    of chains, opening hours, photo attributions, menu terms) are interned, each photo
+    is stored once in a table shared by every place, and timestamps are kept as
+    seconds since the epoch.
+
+    A materialized Place is a copy: modifying it does not change the stored place.
+    """
+
+    def __init__(self) -> None:
+        self.place_id: list[str] = []
+        self.name: list[str] = []
+        self.address: list[str] = []
+        self.opening_hours: list[Optional[str]] = []
+        self.menu_terms: list[tuple[str, ...]] = []
+        self.rating = array("d")
+        self.total_ratings = array("q")
+        self.latitude = array("d")
+        self.longitude = array("d")
+        self.timestamp = array("q")
+        # Photos of place i are photo_ids[photo_offsets[i]:photo_offsets[i + 1]]
+        self.photo_offsets = array("Q", [0])
+        self.photo_ids = array("Q")
+        # Shared photo table: height, width, reference, attributions
+        self.photos: list[PhotoRow] = []
+        self.photo_index: dict[PhotoRow, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.place_id)
+
+    def _photo_id(self, photo: PlacePhoto) -> int:
+        row = (
+            photo.height,
+            photo.width,
+            photo.photo_reference,
+            tuple(sys.intern(text) for text in photo.html_attributions),
+        )
+        photo_id = self.photo_index.get(row)
+
+        if photo_id is None:
+            photo_id = len(self.photos)
+            self.photos.append(row)
+            self.photo_index[row] = photo_id
+
+        return photo_id
+
+    def append(self, place: Place) -> None:
+        self.place_id.append(place.place_id)
+        self.name.append(sys.intern(place.name))
+        self.address.append(place.address)
+        self.opening_hours.append(_intern(place.opening_hours))
+        self.menu_terms.append(tuple(sys.intern(term) for term in place.menu_terms))
+        self.rating.append(place.rating if place.rating is not None else float("nan"))
+        self.total_ratings.append(
+            place.total_ratings if place.total_ratings is not None else MISSING
+        )
+        self.latitude.append(place.latitude)
+        self.longitude.append(place.longitude)
+        self.timestamp.append(_to_seconds(place.timestamp))
+
+        self.photo_ids.extend(self._photo_id(photo) for photo in place.photos)
+        self.photo_offsets.append(len(self.photo_ids))
+
+    def _photo(self, photo_id: int) -> PlacePhoto:
+        height, width, reference, attributions = self.photos[photo_id]
+
+        return PlacePhoto.model_construct(
+            height=height,
+            width=width,
+            photo_reference=reference,
+            html_attributions=list(attributions),
+        )
+
+    def _place(self, i: int) -> Place:
+        rating = self.rating[i]
+        total_ratings = self.total_ratings[i]
+        photo_ids = self.photo_ids[self.photo_offsets[i] : self.photo_offsets[i + 1]]
+
+        # Built from validated places, no need to validate them again
+        return Place.model_construct(
+            place_id=self.place_id[i],
+            name=self.name[i],
+            address=self.address[i],
+            rating=None if rating != rating else rating,
+            total_ratings=None if total_ratings == MISSING else total_ratings,
+            latitude=self.latitude[i],
+            longitude=self.longitude[i],
+            opening_hours=self.opening_hours[i],
+            timestamp=_to_timestamp(self.timestamp[i]),
+            menu_terms=list(self.menu_terms[i]),
+            photos=[self._photo(photo_id) for photo_id in photo_ids],
+        )
+
+    def __iter__(self) -> Iterator[Place]:
+        return map(self._place, range(len(self)))
+
+    @overload
+    def __getitem__(self, index: int) -> Place: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Place]: ...
+
+    def __getitem__(self, index: int | slice) -> Place | list[Place]:
+        if isinstance(index, slice):
+            return [self._place(i) for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("place index out of range")
+
+        return self._place(index)
@@ -0,0 +1,186 @@
+from collections import Counter, defaultdict
+from collections.abc import Collection
+from difflib import SequenceMatcher
+
+from placefinder.planner import METERS_PER_DEGREE
+from placefinder.spatial import distance
+from placefinder.t import DuplicateGroup, PlaceCollection, tokenize
+
+# Places farther apart than this are never the same
+DEDUPE_MAX_DISTANCE = 100
+# Similarity of the normalized names, from 0 to 1, from which places match
+DEDUPE_MIN_SIMILARITY = 0.85
+# Words in more places than this share of the collection, at least
+# DEDUPE_MIN_COMMON places, do not make candidates on their own
+DEDUPE_COMMON_SHARE = 0.01
+DEDUPE_MIN_COMMON = 100
+# Places sharing the start of a word are compared too, to catch typos
+DEDUPE_PREFIX = 4
+# Words in at least this many distinct names are generic ("kebab", "cafe"), they
+# name a kind of place rather than a place
+DEDUPE_GENERIC_NAMES = 5
+# Shared words, not generic, for the words of a name to contain the other's
+DEDUPE_MIN_DISTINCTIVE = 1
+
+
+def name_similarity(name: str, other: str, generic: Collection[str] = ()) -> float:
+    """Similarity of two normalized names, 1 if the words of one contain the other's
+
+    "starbucks" and "starbucks coffee" are most likely the same place when close,
+    "kebab" and "istanbul kebab" are not: the words of one only contain the
+    other's when they share at least DEDUPE_MIN_DISTINCTIVE words not generic.
+    """
+    if not name or not other:
+        return 0.0
+
+    words, other_words = set(name.split()), set(other.split())
+    if (words <= other_words or other_words <= words) and len(
+        (words & other_words).difference(generic)
+    ) >= DEDUPE_MIN_DISTINCTIVE:
+        return 1.0
+
+    return SequenceMatcher(None, name, other, autojunk=False).ratio()
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self.parent[max(i, j)] = min(i, j)
+
+
+def find_duplicates(
+    collection: PlaceCollection,
+    max_distance: float = DEDUPE_MAX_DISTANCE,
+    min_similarity: float = DEDUPE_MIN_SIMILARITY,
+) -> list[DuplicateGroup]:
+    """Group the places of a collection that are probably the same place
+
+    Only places in neighbouring cells of the spatial index and sharing a blocking
+    key, their whole normalized name or an uncommon word of it, are compared, so
+    the cost grows with the number of places rather than the number of pairs.
+    Matches are chained: if A matches B and B matches C, all three are grouped.
+    A place named by a single generic word ("kebab") is only grouped with places
+    of the same name, rather than chaining every place it is close to.
+
+    Args:
+        collection (PlaceCollection)
+        max_distance (float, optional): In meters, at most the spatial index cell size
+        min_similarity (float, optional): See name_similarity
+
+    Returns:
+        list[DuplicateGroup]: From the largest, the places stay in the collection
+    """
+    grid = collection.spatial()
+    if isinstance(collection.places, list):
+        place_ids = [place.place_id for place in collection.places]
+        names = [place.name for place in collection.places]
+        total_ratings = [place.total_ratings or 0 for place in collection.places]
+    else:
+        # Read from the columns, without rebuilding the places
+        place_ids = collection.places.place_id
+        names = collection.places.name
+        total_ratings = [max(count, 0) for count in collection.places.total_ratings]
+
+    # Chains repeat their names, tokenize each one once
+    tokens_of = {name: tokenize(name) for name in set(names)}
+    tokens = [tokens_of[name] for name in names]
+    normalized = [" ".join(words) for words in tokens]
+
+    # Blocking keys of each place: its whole name, its uncommon words and their start
+    words = Counter(word for place_words in tokens for word in set(place_words))
+    common = max(DEDUPE_MIN_COMMON, DEDUPE_COMMON_SHARE * len(names))
+    keys = [
+        {
+            normalized[i],
+            *(
+                key
+                for word in place_words
+                if words[word] <= common
+                for key in (
+                    (word, word[:DEDUPE_PREFIX])
+                    if len(word) > DEDUPE_PREFIX and word.isalpha()
+                    else (word,)
+                )
+            ),
+        }
+        for i, place_words in enumerate(tokens)
+    ]
+    # Words in many distinct names, see DEDUPE_GENERIC_NAMES
+    names_of = Counter(word for name in set(normalized) for word in set(name.split()))
+    generic = {
+        word for word, count in names_of.items() if count >= DEDUPE_GENERIC_NAMES
+    }
+    alone = [
+        len(place_words) == 1 and place_words[0] in generic for place_words in tokens
+    ]
+
+    # A key of a single place makes no candidate, leave it out of the blocks
+    shared = Counter(key for place_keys in keys for key in place_keys)
+
+    blocks: dict[tuple[tuple[int, int], str], list[int]] = defaultdict(list)
+    for cell, points in grid.cells.items():
+        for i in points:
+            for key in keys[i]:
+                if shared[key] > 1:
+                    blocks[cell, key].append(i)
+
+    candidates: set[tuple[int, int]] = set()
+    for ((x, y), key), block in blocks.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in blocks.get(((x + dx, y + dy), key), ()):
+                    candidates.update((i, j) for i in block if i < j)
+
+    def location(i: int) -> tuple[float, float]:
+        return grid.y[i] / METERS_PER_DEGREE, grid.x[i] / grid.scale
+
+    groups = _UnionFind(len(names))
+    matches: list[tuple[int, int, float, float]] = []
+
+    for i, j in candidates:
+        meters = distance(*location(i), *location(j))
+        if meters > max_distance:
+            continue
+        if (alone[i] or alone[j]) and normalized[i] != normalized[j]:
+            continue
+
+        similarity = name_similarity(normalized[i], normalized[j], generic)
+        if similarity >= min_similarity:
+            groups.union(i, j)
+            matches.append((i, j, meters, similarity))
+
+    # Places, largest distance and lowest similarity of the matches, by group
+    members: dict[int, set[int]] = defaultdict(set)
+    worst: dict[int, tuple[float, float]] = {}
+    for i, j, meters, similarity in matches:
+        root = groups.find(i)
+        members[root].update((i, j))
+        largest, lowest = worst.get(root, (0.0, 1.0))
+        worst[root] = (max(largest, meters), min(lowest, similarity))
+
+    report = []
+    for root, group in members.items():
+        indexes = sorted(group)
+        largest, lowest = worst[root]
+        report.append(
+            DuplicateGroup(
+                place_ids=[place_ids[i] for i in indexes],
+                names=[names[i] for i in indexes],
+                keep=place_ids[max(indexes, key=lambda i: (total_ratings[i], -i))],
+                distance=largest,
+                similarity=lowest,
+            )
+        )
+
+    report.sort(key=lambda group: (-len(group.place_ids), group.place_ids[0]))
+    return report
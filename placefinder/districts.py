@@ -0,0 +1,169 @@
+import math
+import re
+from typing import Iterable, Optional
+
+from placefinder.planner import METERS_PER_DEGREE
+from placefinder.t import Location
+
+# Places farther than this from every district centroid are not in any district,
+# unless the districts have a boundary
+DISTRICT_MAX_DISTANCE = 4000
+# Postal codes, the last one of an address is that of the place
+POSTAL_CODE = re.compile(r"\b\d{5}\b")
+
+
+def contains(
+    polygon: list[tuple[float, float]], latitude: float, longitude: float
+) -> bool:
+    """Whether a point is inside a polygon of (latitude, longitude), by ray casting"""
+    inside = False
+
+    for (lat, lng), (next_lat, next_lng) in zip(polygon, polygon[1:] + polygon[:1]):
+        if (lat > latitude) != (next_lat > latitude) and longitude < lng + (
+            latitude - lat
+        ) * (next_lng - lng) / (next_lat - lat):
+            inside = not inside
+
+    return inside
+
+
+class DistrictIndex:
+    """Assigns places to districts
+
+    Districts named after postal codes, such as the arrondissements of Paris, are
+    read from the postal code of the address: a place whose postal code is not a
+    district is in none. Places without a postal code are located from their
+    coordinates.
+
+    From coordinates, districts are approximated by the Voronoi cells of their
+    centroids, which is close enough for compact districts such as postal codes,
+    within the boundary of their location, or else cut at `max_distance` meters.
+    Distances are computed on an equirectangular projection.
+
+    Vectorized assignment of many places lives in placefinder.columnar, so that
+    this module does not load NumPy.
+    """
+
+    def __init__(
+        self,
+        centroids: dict[str, tuple[float, float]],
+        max_distance: float = DISTRICT_MAX_DISTANCE,
+        aliases: Optional[dict[str, str]] = None,
+        boundaries: Optional[dict[str, list[tuple[float, float]]]] = None,
+    ):
+        """
+        Args:
+            centroids (dict[str, tuple[float, float]]): (latitude, longitude) by district
+            max_distance (float, optional): In meters, for districts without a boundary
+            aliases (dict[str, str], optional): District names by other postal codes
+            boundaries (dict[str, list[tuple[float, float]]], optional): Outline
+                around each district, usually that of its location
+        """
+        self.names = list(centroids)
+        self.latitudes = [latitude for latitude, _ in centroids.values()]
+        self.longitudes = [longitude for _, longitude in centroids.values()]
+        # Meters per degree of longitude at each centroid
+        self.scales = [
+            METERS_PER_DEGREE * math.cos(math.radians(latitude))
+            for latitude in self.latitudes
+        ]
+        self.max_distance = max_distance
+
+        # Index of each district by name and postal code, when all are postal codes
+        self.postal_codes: dict[str, int] = {}
+        if self.names and all(POSTAL_CODE.fullmatch(name) for name in self.names):
+            self.postal_codes = {name: i for i, name in enumerate(self.names)}
+            for alias, name in (aliases or {}).items():
+                self.postal_codes[alias] = self.postal_codes[name]
+
+        # Distinct outlines, and the index of that of each district, -1 for none
+        self.boundaries: list[list[tuple[float, float]]] = []
+        self.boundary: list[int] = []
+        known: dict[tuple[tuple[float, float], ...], int] = {}
+        for name in self.names:
+            outline = (boundaries or {}).get(name)
+            if not outline:
+                self.boundary.append(-1)
+                continue
+            key = tuple(outline)
+            if key not in known:
+                known[key] = len(self.boundaries)
+                self.boundaries.append(list(outline))
+            self.boundary.append(known[key])
+
+    @classmethod
+    def from_locations(cls, locations: Iterable[Location]) -> Optional["DistrictIndex"]:
+        """Index of the districts of every location, None if none has centroids"""
+        centroids = {}
+        aliases = {}
+        boundaries = {}
+        for location in locations:
+            centroids.update(location.district_centroids)
+            aliases.update(location.district_aliases)
+            if location.boundary:
+                boundaries.update(
+                    dict.fromkeys(location.district_centroids, location.boundary)
+                )
+
+        return (
+            cls(centroids, aliases=aliases, boundaries=boundaries)
+            if centroids
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def locate_address(self, address: str) -> Optional[int]:
+        """Index in self.names of the district of an address from its postal code,
+        -1 if it is in none, None if it has no postal code or districts are not
+        postal codes"""
+        if not self.postal_codes:
+            return None
+
+        codes = POSTAL_CODE.findall(address)
+        if not codes:
+            return None
+
+        return self.postal_codes.get(codes[-1], -1)
+
+    def locate(
+        self, latitude: float, longitude: float, address: Optional[str] = None
+    ) -> int:
+        """Index in self.names of the district of a place, -1 if in none
+
+        Args:
+            latitude (float)
+            longitude (float)
+            address (str, optional): Used first, see locate_address
+        """
+        if address:
+            located = self.locate_address(address)
+            if located is not None:
+                return located
+
+        best, best_distance = -1, math.inf
+
+        for i, (lat, lng, scale) in enumerate(
+            zip(self.latitudes, self.longitudes, self.scales)
+        ):
+            dy = (latitude - lat) * METERS_PER_DEGREE
+            dx = (longitude - lng) * scale
+            distance = dx * dx + dy * dy
+            if distance < best_distance:
+                best, best_distance = i, distance
+
+        if best < 0:
+            return -1
+
+        boundary = self.boundary[best]
+        if boundary < 0:
+            return best if best_distance < self.max_distance**2 else -1
+
+        return best if contains(self.boundaries[boundary], latitude, longitude) else -1
+
+    def district(
+        self, latitude: float, longitude: float, address: Optional[str] = None
+    ) -> Optional[str]:
+        i = self.locate(latitude, longitude, address)
+        return self.names[i] if i >= 0 else None
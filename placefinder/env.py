@@ -1,13 +1,19 @@
 import os
+from functools import cache
 
-from dotenv import load_dotenv
 from pydantic import SecretStr
 
 from placefinder.t import Env
 
-load_dotenv(dotenv_path=".env", override=True, verbose=True)
 
+@cache
+def get_env() -> Env:
+    """Read the environment, and the .env file, on first use only"""
+    from dotenv import load_dotenv
 
-env = Env(
-    GMAPS_API_KEY=SecretStr(os.getenv("GMAPS_API_KEY", "")),
-)
+    load_dotenv(dotenv_path=".env", override=True, verbose=True)
+
+    return Env(
+        GMAPS_API_KEY=SecretStr(os.getenv("GMAPS_API_KEY", "")),
+        GMAPS_BASE_URL=os.getenv("GMAPS_BASE_URL", "https://maps.googleapis.com"),
+    )
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class EndpointMetrics:
+    """Counters and latency histogram of a single endpoint"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.retries = 0
+        self.cost = 0.0
+        self.seconds = 0.0
+        # One count per bucket, plus the last one for slower calls
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "retries": self.retries,
+            "estimated_cost": round(self.cost, 6),
+            "latency_seconds_sum": self.seconds,
+            "latency_buckets": {
+                **{str(bound): count for bound, count in zip(BUCKETS, self.buckets)},
+                "+Inf": self.buckets[-1],
+            },
+        }
+
+
+class Metrics:
+    """Per-endpoint call counts, latencies, retries, cache hits and estimated cost
+
+    Endpoints are free-form names, e.g. "places_nearby", "photo" or "ocr".
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.started_at = time.time()
+
+    def _get(self, endpoint: str) -> EndpointMetrics:
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointMetrics()
+        return self.endpoints[endpoint]
+
+    def observe(
+        self, endpoint: str, seconds: float, cost: float = 0.0, error: bool = False
+    ) -> None:
+        """Record a call that was actually performed"""
+        with self.lock:
+            stats = self._get(endpoint)
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.cost += cost
+            stats.buckets[bisect_left(BUCKETS, seconds)] += 1
+            if error:
+                stats.errors += 1
+
+    def cache_hit(self, endpoint: str) -> None:
+        """Record a call answered from a cache instead"""
+        with self.lock:
+            self._get(endpoint).cache_hits += 1
+
+    def retry(self, endpoint: str) -> None:
+        with self.lock:
+            self._get(endpoint).retries += 1
+
+    @contextmanager
+    def timer(self, endpoint: str, cost: float = 0.0) -> Iterator[None]:
+        """Time the enclosed call, counted as an error if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(endpoint, time.perf_counter() - start, cost, error=True)
+            raise
+        self.observe(endpoint, time.perf_counter() - start, cost)
+
+    def merge(self, data: dict) -> None:
+        """Add the counts of an exported registry, e.g. one from another process
+
+        Args:
+            data (dict): Output of `to_dict`
+        """
+        with self.lock:
+            for endpoint, other in data["endpoints"].items():
+                stats = self._get(endpoint)
+                stats.calls += other["calls"]
+                stats.cache_hits += other["cache_hits"]
+                stats.errors += other["errors"]
+                stats.retries += other["retries"]
+                stats.cost += other["estimated_cost"]
+                stats.seconds += other["latency_seconds_sum"]
+                for i, count in enumerate(other["latency_buckets"].values()):
+                    stats.buckets[i] += count
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": time.time() - self.started_at,
+                "endpoints": {
+                    endpoint: stats.to_dict()
+                    for endpoint, stats in sorted(self.endpoints.items())
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Export in the Prometheus text format"""
+        lines = []
+
+        def family(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP placefinder_{name} {description}")
+            lines.append(f"# TYPE placefinder_{name} {kind}")
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+
+            counters = [
+                ("calls_total", "calls", "Calls performed"),
+                ("cache_hits_total", "cache_hits", "Calls answered from a cache"),
+                ("errors_total", "errors", "Calls that raised"),
+                ("retries_total", "retries", "Calls retried"),
+                ("estimated_cost_usd_total", "cost", "Estimated billable cost"),
+            ]
+            for name, attribute, description in counters:
+                family(name, "counter", description)
+                for endpoint, stats in endpoints:
+                    value = round(getattr(stats, attribute), 6)
+                    lines.append(f'placefinder_{name}{{endpoint="{endpoint}"}} {value}')
+
+            family("latency_seconds", "histogram", "Latency of performed calls")
+            for endpoint, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip([*map(str, BUCKETS), "+Inf"], stats.buckets):
+                    cumulative += count
+                    lines.append(
+                        f'placefinder_latency_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'placefinder_latency_seconds_sum{{endpoint="{endpoint}"}} {stats.seconds}'
+                )
+                lines.append(
+                    f'placefinder_latency_seconds_count{{endpoint="{endpoint}"}} {stats.calls}'
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Write `<path>.json` and `<path>.prom`"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(f"{path}.json").write_text(self.to_json())
+        Path(f"{path}.prom").write_text(self.to_prometheus())
+
+
+metrics = Metrics()
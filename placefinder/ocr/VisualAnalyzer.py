@@ -1,83 +1,531 @@
-import tempfile
-from pathlib import Path
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
 
 import cv2
 import easyocr
 import httpx
+import numpy as np
 
 from placefinder import error_console
-from placefinder.env import env
-from placefinder.t import PlacePhoto
+from placefinder.cache import Cache, make_key
+from placefinder.env import get_env
+from placefinder.metrics import Metrics, metrics
+from placefinder.ocr.hashes import (
+    PhotoHashIndex,
+    dhash,
+    distance,
+    same_photo,
+    thumbnail,
+)
+from placefinder.t import Place, PlacePhoto
+
+PHOTO_PATH = "/maps/api/place/photo"
+PHOTO_MAX_WIDTH = 800
+# Longest side of the photos downloaded for OCR, signs stay legible and OCR time
+# grows with the number of pixels
+PHOTO_MAX_SIDE = 800
+# Price of 1000 photo requests, in USD
+PHOTO_PRICE = 7.0
+
+# OCR texts with a lower confidence are dropped
+OCR_MIN_CONFIDENCE = 0.2
+
+# Photos downloaded at once, sharing one pool of connections
+DOWNLOAD_WORKERS = 8
+# OCR runs in parallel with downloads, the model already uses every core
+OCR_WORKERS = 1
+# Photos recognized at once by the reader, 1 to recognize them one by one. Batches
+# pad photos to a common size, which may change what the reader finds: `make bench`
+# with `--ocr-batch 1 8` checks the terms against those found one by one.
+OCR_BATCH_SIZE = 1
+# Seconds an OCR worker waits for more photos before running a partial batch
+OCR_BATCH_WAIT = 0.05
+# Photos are batched with photos of the same size, rounded up to this many pixels,
+# as the reader pads a batch to its largest height and width: a portrait photo
+# batched with landscape ones would make them all square
+OCR_BATCH_BUCKET = 200
+# Photos are scaled to this width to look for text before running the OCR
+TEXT_PREFILTER_WIDTH = 320
+# Places whose photos are downloaded ahead of OCR, bounds the decoded images in memory
+MAX_PENDING_PLACES = 32
 
 
 class VisualAnalyzer:
-    """Class for analyzing images using OCR"""
+    """Class for analyzing images using OCR
+
+    Photos are downloaded concurrently over a shared HTTP client, at a resolution
+    picked from their size, and decoded in memory. Photos showing nothing like text
+    are skipped, the others are queued for OCR workers recognizing them, one by one
+    or by batches of similar sizes, so downloading overlaps with recognition.
+
+    With a cache, terms are stored per photo reference and per image content, so a
+    known photo is neither downloaded nor analyzed again, and a known image served
+    under a new reference is downloaded but not analyzed.
+
+    With a hash index, an image looking like one already analyzed, e.g. the same
+    storefront re-encoded or resized, or being analyzed, reuses its terms too.
+    """
 
-    def __init__(self, languages: list[str] = ["en"]):
+    def __init__(
+        self,
+        languages: list[str] = ["en"],
+        download_workers: int = DOWNLOAD_WORKERS,
+        ocr_workers: int = OCR_WORKERS,
+        cache: Optional[Cache] = None,
+        min_confidence: float = OCR_MIN_CONFIDENCE,
+        metrics: Metrics = metrics,
+        batch_size: int = OCR_BATCH_SIZE,
+        prefilter: bool = True,
+        hashes: Optional[PhotoHashIndex] = None,
+    ):
+        """
+        Args:
+            batch_size (int, optional): Photos recognized at once, see OCR_BATCH_SIZE
+            prefilter (bool, optional): Skip photos in which has_text finds nothing
+            hashes (PhotoHashIndex, optional): Terms of near-identical images
+        """
         self.reader = easyocr.Reader(languages)
-        self.temp = tempfile.TemporaryDirectory()
-        self.temp_dir = self.temp.name
+        self.cache = cache
+        self.min_confidence = min_confidence
+        self.metrics = metrics
+        self.batch_size = max(1, batch_size)
+        self.prefilter = prefilter
+        self.hashes = hashes
+        # Hash and thumbnail of the images queued for OCR, near-identical images
+        # wait for them. Different images may share a hash, hence a list
+        self.hash_lock = threading.Lock()
+        self.pending_hashes: list[tuple[int, np.ndarray, Future[set[str]]]] = []
+        # Anything changing the terms found in an image is part of the cache keys
+        self.settings = {
+            "languages": sorted(languages),
+            "min_confidence": min_confidence,
+            "prefilter": prefilter,
+        }
+        self.client = httpx.Client(
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=download_workers),
+        )
+        self.download_pool = ThreadPoolExecutor(max_workers=download_workers)
+        # Images waiting for OCR, None stops a worker
+        self.ocr_queue: queue.Queue[Optional[tuple[np.ndarray, Future[set[str]]]]] = (
+            queue.Queue()
+        )
+        self.ocr_workers = [
+            threading.Thread(target=self._ocr_worker, daemon=True)
+            for _ in range(ocr_workers)
+        ]
+        for worker in self.ocr_workers:
+            worker.start()
+
+    def close(self) -> None:
+        self.download_pool.shutdown(cancel_futures=True)
+        for _ in self.ocr_workers:
+            self.ocr_queue.put(None)
+        self.client.close()
 
-    def download_photo(self, photo_reference: str, max_width: int = 800) -> str:
+    def download_photo(
+        self, photo_reference: str, max_width: int = PHOTO_MAX_WIDTH
+    ) -> bytes:
         """
-        Download a photo from Google Places API and save to temp file
+        Download a photo from Google Places API
 
         Raises:
             HTTPStatusError: if response.status is not a success
 
         """
-        filepath = Path(f"{self.temp_dir}/{photo_reference[:10]}.jpg")
-        filepath.touch()
-        url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth={max_width}&photoreference={photo_reference}&key={env.GMAPS_API_KEY}"
-        response = httpx.get(url, follow_redirects=True)
-        response.raise_for_status()
+        env = get_env()
+
+        with self.metrics.timer("photo", cost=PHOTO_PRICE / 1000):
+            response = self.client.get(
+                env.GMAPS_BASE_URL + PHOTO_PATH,
+                params={
+                    "maxwidth": max_width,
+                    "photoreference": photo_reference,
+                    "key": env.GMAPS_API_KEY.get_secret_value(),
+                },
+            )
+            response.raise_for_status()
+
+        return response.content
 
-        with open(filepath, "wb") as f:
-            f.write(response.content)
+    @staticmethod
+    def photo_width(photo: PlacePhoto, max_side: int = PHOTO_MAX_SIDE) -> int:
+        """Width to download a photo at, so that its longest side is at most `max_side`
 
-        return str(filepath)
+        Google never upscales photos, so asking for more than the photo width only
+        changes the cache key.
+        """
+        if photo.width <= 0 or photo.height <= 0:
+            return max_side
+
+        scale = min(1.0, max_side / max(photo.width, photo.height))
+        return max(1, round(photo.width * scale))
+
+    @staticmethod
+    def decode_image(data: bytes) -> Optional[np.ndarray]:
+        """Decode an image from its encoded bytes, None if it is not a valid image"""
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    @staticmethod
+    def has_text(image: np.ndarray) -> bool:
+        """Whether an image shows something like a line of text, a few milliseconds
+
+        Characters have strong edges close to each other: edges are joined
+        horizontally, and any resulting region wider than tall and dense enough is
+        taken as text. Made to let through every photo with a sign or a menu, at the
+        cost of letting through some photos without text.
+        """
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        height, width = grey.shape
+        if width > TEXT_PREFILTER_WIDTH:
+            height = max(1, round(height * TEXT_PREFILTER_WIDTH / width))
+            grey = cv2.resize(
+                grey, (TEXT_PREFILTER_WIDTH, height), interpolation=cv2.INTER_AREA
+            )
+
+        gradient = cv2.morphologyEx(
+            grey,
+            cv2.MORPH_GRADIENT,
+            cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)),
+        )
+        _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        # Otsu splits any image in two, faint gradients are not edges
+        edges[gradient < 32] = 0
+
+        lines = cv2.morphologyEx(
+            edges,
+            cv2.MORPH_CLOSE,
+            cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)),
+        )
+        contours, _ = cv2.findContours(
+            lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if h < 5 or w < 1.5 * h or h > grey.shape[0] / 2:
+                continue
+            if cv2.countNonZero(edges[y : y + h, x : x + w]) > 0.2 * w * h:
+                return True
 
-    def extract_text_from_image(self, image_path: str) -> list[str]:
+        return False
+
+    def extract_text_from_image(self, image: np.ndarray) -> list[str]:
         """Extract text from an image using EasyOCR"""
-        # Read the image
-        image = cv2.imread(image_path)
+        return self.extract_text_from_images([image])[0]
+
+    def extract_text_from_images(self, images: list[np.ndarray]) -> list[list[str]]:
+        """Extract text from images using EasyOCR, in a single batch when many
 
-        # Run OCR
-        results = self.reader.readtext(image)
+        The reader batches images of a single size, smaller ones are padded, so
+        the images should be of similar sizes, see batch_key.
+        """
+        start = time.perf_counter()
+        try:
+            if len(images) == 1:
+                results = [self.reader.readtext(images[0])]
+            else:
+                height = max(image.shape[0] for image in images)
+                width = max(image.shape[1] for image in images)
+                padded = [
+                    cv2.copyMakeBorder(
+                        image,
+                        0,
+                        height - image.shape[0],
+                        0,
+                        width - image.shape[1],
+                        cv2.BORDER_CONSTANT,
+                        value=(255, 255, 255),
+                    )
+                    for image in images
+                ]
+                results = self.reader.readtext_batched(padded, batch_size=len(padded))
+        except Exception:
+            self.metrics.observe("ocr", time.perf_counter() - start, error=True)
+            raise
+
+        # Observed per image, so the calls of the "ocr" metrics count images
+        seconds = (time.perf_counter() - start) / len(images)
+        for _ in images:
+            self.metrics.observe("ocr", seconds)
 
         # Extract text from results
-        texts = [text for _, text, conf in results if conf > 0.2]
-        return texts
+        return [
+            [text for _, text, conf in result if conf > self.min_confidence]
+            for result in results
+        ]
+
+    @staticmethod
+    def extract_terms(texts: list[str]) -> set[str]:
+        """Split OCR texts into cleaned, lowercase terms"""
+        terms = set()
+
+        # Process each text to extract individual terms
+        for text in texts:
+            # Split text into words
+            words = text.split()
+            for word in words:
+                # Clean the word (remove punctuation, etc.)
+                clean_word = "".join(
+                    c for c in word if c.isalnum() or c.isspace()
+                ).strip()
+                if clean_word and len(clean_word) > 2:  # Ignore very short terms
+                    terms.add(clean_word.lower())
+
+        return terms
+
+    def _photo_key(self, photo_reference: str, max_width: int) -> str:
+        return make_key(
+            photo_reference=photo_reference, max_width=max_width, **self.settings
+        )
+
+    def _image_key(self, digest: str) -> str:
+        return make_key(digest=digest, **self.settings)
+
+    def _cached(self, namespace: str, key: str) -> Optional[Future[set[str]]]:
+        if self.cache is None:
+            return None
+
+        terms = self.cache.get(namespace, key)
+        if terms is None:
+            return None
+
+        self.metrics.cache_hit(namespace)
+        future: Future[set[str]] = Future()
+        future.set_result(set(terms))
+        return future
+
+    def _store(
+        self, photo_reference: str, max_width: int, digest: str, terms: set[str]
+    ) -> None:
+        if self.cache is not None:
+            self.cache.set("ocr_image", self._image_key(digest), sorted(terms))
+            self.cache.set(
+                "ocr_photo", self._photo_key(photo_reference, max_width), sorted(terms)
+            )
+
+    @staticmethod
+    def batch_key(image: np.ndarray) -> tuple[int, int]:
+        """Size bucket of an image, see OCR_BATCH_BUCKET"""
+        height, width = image.shape[:2]
+        return -(-height // OCR_BATCH_BUCKET), -(-width // OCR_BATCH_BUCKET)
+
+    def _ocr_worker(self) -> None:
+        """Recognize queued images by batches of a size bucket, until a None is queued
+
+        A batch runs once full, or OCR_BATCH_WAIT after its first image was queued.
+        """
+        batches: dict[tuple[int, int], list[tuple[np.ndarray, Future[set[str]]]]] = {}
+        deadlines: dict[tuple[int, int], float] = {}
+        stopping = False
+
+        while batches or not stopping:
+            ready = None
+
+            if stopping:
+                ready = next(iter(batches))
+            else:
+                timeout = None
+                if deadlines:
+                    timeout = max(0.0, min(deadlines.values()) - time.monotonic())
+                try:
+                    item = self.ocr_queue.get(timeout=timeout)
+                except queue.Empty:
+                    ready = min(deadlines, key=deadlines.__getitem__)
+                else:
+                    if item is None:
+                        stopping = True
+                        continue
+
+                    key = self.batch_key(item[0])
+                    batch = batches.setdefault(key, [])
+                    deadlines.setdefault(key, time.monotonic() + OCR_BATCH_WAIT)
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        ready = key
+
+            if ready is not None:
+                del deadlines[ready]
+                self._recognize(batches.pop(ready))
+
+    def _recognize(self, batch: list[tuple[np.ndarray, Future[set[str]]]]) -> None:
+        images = [image for image, _ in batch]
+        try:
+            texts = self.extract_text_from_images(images)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), image_texts in zip(batch, texts):
+            future.set_result(self.extract_terms(image_texts))
+
+    def _ocr(
+        self, image: np.ndarray, photo_reference: str, max_width: int, digest: str
+    ) -> Future[set[str]]:
+        """Queue an image for OCR, the terms found are cached once recognized"""
+
+        def store(done: Future[set[str]]) -> None:
+            if done.exception() is None:
+                self._store(photo_reference, max_width, digest, done.result())
+
+        future: Future[set[str]] = Future()
+
+        if self.hashes is not None:
+            photo_hash, photo_thumbnail = dhash(image), thumbnail(image)
+            similar = self._similar(photo_hash, photo_thumbnail, future)
+            if similar is not None:
+                self.metrics.cache_hit("ocr_similar")
+                similar.add_done_callback(store)
+                return similar
+
+            future.add_done_callback(
+                lambda done: self._index(photo_hash, photo_thumbnail, done)
+            )
+
+        if self.prefilter:
+            with self.metrics.timer("text_prefilter"):
+                has_text = self.has_text(image)
+        else:
+            has_text = True
+
+        if not has_text:
+            future.set_result(set())
+        else:
+            self.ocr_queue.put((image, future))
+
+        future.add_done_callback(store)
+        return future
+
+    def _similar(
+        self, photo_hash: int, photo_thumbnail: np.ndarray, future: Future[set[str]]
+    ) -> Optional[Future[set[str]]]:
+        """Terms of an image near-identical to a hash and thumbnail, being recognized
+        or known
+
+        Registers `future` as the image being recognized for them if none is.
+        """
+        assert self.hashes is not None
+
+        with self.hash_lock:
+            for pending, pending_thumbnail, similar in self.pending_hashes:
+                close = distance(photo_hash, pending) <= self.hashes.max_distance
+                if close and same_photo(photo_thumbnail, pending_thumbnail):
+                    return similar
+
+            terms = self.hashes.find(
+                make_key(**self.settings), photo_hash, photo_thumbnail
+            )
+            if terms is None:
+                self.pending_hashes.append((photo_hash, photo_thumbnail, future))
+                return None
+
+        known: Future[set[str]] = Future()
+        known.set_result(terms)
+        return known
+
+    def _index(
+        self, photo_hash: int, photo_thumbnail: np.ndarray, done: Future[set[str]]
+    ) -> None:
+        assert self.hashes is not None
+
+        with self.hash_lock:
+            # Indexed before leaving the pending images, so it is always found
+            if done.exception() is None:
+                self.hashes.add(
+                    make_key(**self.settings),
+                    photo_hash,
+                    photo_thumbnail,
+                    done.result(),
+                )
+            self.pending_hashes = [
+                pending for pending in self.pending_hashes if pending[2] is not done
+            ]
+
+    def _download(self, photo: PlacePhoto) -> Optional[Future[set[str]]]:
+        """Download and decode a photo, then queue it for OCR
+
+        Runs in the download pool, the returned future resolves to the photo terms.
+        """
+        max_width = self.photo_width(photo)
+
+        cached = self._cached(
+            "ocr_photo", self._photo_key(photo.photo_reference, max_width)
+        )
+        if cached is not None:
+            return cached
+
+        try:
+            data = self.download_photo(photo.photo_reference, max_width)
+        except httpx.HTTPError as e:
+            error_console.print(e)
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        cached = self._cached("ocr_image", self._image_key(digest))
+        if cached is not None:
+            self._store(photo.photo_reference, max_width, digest, cached.result())
+            return cached
+
+        image = self.decode_image(data)
+        if image is None:
+            return None
+
+        return self._ocr(image, photo.photo_reference, max_width, digest)
+
+    def _submit(
+        self, photos: list[PlacePhoto], limit: int
+    ) -> list[Future[Optional[Future[set[str]]]]]:
+        # Limit photos to reduce API usage
+        return [
+            self.download_pool.submit(self._download, photo)
+            for photo in photos[:limit]
+            if photo.photo_reference
+        ]
+
+    @staticmethod
+    def _collect(downloads: list[Future[Optional[Future[set[str]]]]]) -> list[str]:
+        all_terms: set[str] = set()
+
+        for download in downloads:
+            ocr = download.result()
+            if ocr is not None:
+                all_terms |= ocr.result()
+
+        return list(all_terms)
 
     def analyze_place_photos(
         self, photos: list[PlacePhoto], limit: int = 1
     ) -> list[str]:
-        all_terms = set()
+        return self._collect(self._submit(photos, limit))
 
-        # Limit photos to reduce API usage
-        for i, photo in enumerate(photos[:limit]):
-            if not photo.photo_reference:
-                continue
+    def analyze_places(
+        self, places: Iterable[Place], limit: int = 1
+    ) -> Iterator[tuple[Place, list[str]]]:
+        """Analyze the photos of many places, downloading ahead while OCR runs
 
-            try:
-                image_path = self.download_photo(photo.photo_reference)
-            except httpx.HTTPStatusError as e:
-                error_console.print(e)
-                continue
+        Args:
+            places (Iterable[Place])
+            limit (int, optional): Photos analyzed per place
 
-            # Extract text from image
-            texts = self.extract_text_from_image(image_path)
-
-            # Process each text to extract individual terms
-            for text in texts:
-                # Split text into words
-                words = text.split()
-                for word in words:
-                    # Clean the word (remove punctuation, etc.)
-                    clean_word = "".join(
-                        c for c in word if c.isalnum() or c.isspace()
-                    ).strip()
-                    if clean_word and len(clean_word) > 2:  # Ignore very short terms
-                        all_terms.add(clean_word.lower())
+        Yields:
+            tuple[Place, list[str]]: Each place, in order, with the terms found in its photos
+        """
+        pending: deque[tuple[Place, list]] = deque()
 
-        return list(all_terms)
+        for place in places:
+            pending.append((place, self._submit(place.photos, limit)))
+
+            if len(pending) >= MAX_PENDING_PLACES:
+                done, downloads = pending.popleft()
+                yield done, self._collect(downloads)
+
+        while pending:
+            done, downloads = pending.popleft()
+            yield done, self._collect(downloads)
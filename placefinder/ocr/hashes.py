@@ -0,0 +1,196 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+
+HASH_INDEX_PATH = ".cache/photo_hashes.sqlite"
+# Side of the thumbnail hashed, HASH_SIZE ** 2 bits. At 8, the usual size, signs
+# with a different text are only a few bits apart
+HASH_SIZE = 16
+HASH_BITS = HASH_SIZE**2
+# Photos whose hashes differ by at most this many bits may be the same photo:
+# re-encoded, resized or barely edited, once their thumbnails confirm it
+HASH_MAX_DISTANCE = 8
+# Side of the grey thumbnail kept with each hash to confirm a match: signs with a
+# different text can be a few bits apart, or none, while a letter changes many pixels
+THUMBNAIL_SIZE = 64
+# Photos whose thumbnails differ by more than this on any pixel, out of 255, are
+# different photos. Re-encoded or resized copies differ by about 10 at most
+THUMBNAIL_MAX_DIFFERENCE = 32
+# Hashes within HASH_MAX_DISTANCE bits share at least one of these many bands
+BANDS = HASH_MAX_DISTANCE + 1
+# (shift, mask) of each band
+_BANDS = [
+    (
+        HASH_BITS * i // BANDS,
+        (1 << (HASH_BITS * (i + 1) // BANDS - HASH_BITS * i // BANDS)) - 1,
+    )
+    for i in range(BANDS)
+]
+
+
+def dhash(image: np.ndarray) -> int:
+    """Difference hash of an image, whether each pixel of a thumbnail is brighter
+    than its right neighbour
+
+    Re-encoding, resizing or small edits barely change it, unlike a digest.
+    """
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(
+        grey, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA
+    )
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def distance(photo_hash: int, other: int) -> int:
+    """Number of bits two hashes differ by"""
+    return (photo_hash ^ other).bit_count()
+
+
+def thumbnail(image: np.ndarray) -> np.ndarray:
+    """Grey THUMBNAIL_SIZE square thumbnail of an image, see same_photo"""
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(
+        grey, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA
+    )
+
+
+def same_photo(thumbnail: np.ndarray, other: np.ndarray) -> bool:
+    """Whether two thumbnails of images with close hashes show the same photo"""
+    difference = np.abs(thumbnail.astype(np.int16) - other.astype(np.int16))
+    return int(difference.max()) <= THUMBNAIL_MAX_DIFFERENCE
+
+
+class PhotoHashIndex:
+    """OCR terms of photos by perceptual hash, kept across runs in SQLite
+
+    Hashes are also indexed by band, so finding the hashes close to a hash only
+    reads those sharing a band with it rather than every hash. A close hash is
+    only a match once the thumbnails of both photos confirm it.
+    Terms depend on the OCR settings, the `settings` key keeps them apart.
+    """
+
+    def __init__(
+        self, path: str = HASH_INDEX_PATH, max_distance: int = HASH_MAX_DISTANCE
+    ):
+        """
+        Args:
+            path (str): SQLite database file, created if missing
+            max_distance (int, optional): At most HASH_MAX_DISTANCE, see BANDS
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.max_distance = min(max_distance, HASH_MAX_DISTANCE)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+
+        # Indexes made before thumbnails were kept can't confirm matches, start over
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(hashes)")]
+        if columns and "thumbnail" not in columns:
+            self.conn.execute("DROP TABLE hashes")
+            self.conn.execute("DROP TABLE IF EXISTS bands")
+
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS hashes (
+                settings TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                thumbnail BLOB NOT NULL,
+                terms TEXT NOT NULL
+            )
+            """
+        )
+        # Different photos may share a hash, each one is kept
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (settings, hash)"
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bands (
+                settings TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                hash BLOB NOT NULL,
+                PRIMARY KEY (settings, band, value, hash)
+            )
+            """
+        )
+
+    def find(
+        self, settings: str, photo_hash: int, photo_thumbnail: np.ndarray
+    ) -> Optional[set[str]]:
+        """Terms of the closest known photo within max_distance whose thumbnail
+        confirms the match, None if none is"""
+        bands = [(photo_hash >> shift) & mask for shift, mask in _BANDS]
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT hashes.hash, hashes.thumbnail, hashes.terms FROM hashes
+                WHERE settings = ? AND hash IN (
+                    SELECT hash FROM bands WHERE settings = ? AND (
+                        {" OR ".join(["(band = ? AND value = ?)"] * BANDS)}
+                    )
+                )
+                """,
+                (
+                    settings,
+                    settings,
+                    *(value for band in enumerate(bands) for value in band),
+                ),
+            ).fetchall()
+
+        close = []
+        for known, known_thumbnail, terms in rows:
+            bits = distance(photo_hash, int.from_bytes(known, "big"))
+            if bits <= self.max_distance:
+                close.append((bits, known_thumbnail, terms))
+
+        for _, known_thumbnail, terms in sorted(close, key=lambda row: row[0]):
+            known_pixels = np.frombuffer(known_thumbnail, dtype=np.uint8).reshape(
+                THUMBNAIL_SIZE, THUMBNAIL_SIZE
+            )
+            if same_photo(photo_thumbnail, known_pixels):
+                return set(json.loads(terms))
+
+        return None
+
+    def add(
+        self,
+        settings: str,
+        photo_hash: int,
+        photo_thumbnail: np.ndarray,
+        terms: set[str],
+    ) -> None:
+        blob = photo_hash.to_bytes(HASH_BITS // 8, "big")
+
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                """
+                INSERT INTO hashes (settings, hash, thumbnail, terms)
+                VALUES (?, ?, ?, ?)
+                """,
+                (settings, blob, photo_thumbnail.tobytes(), json.dumps(sorted(terms))),
+            )
+            self.conn.executemany(
+                """
+                INSERT OR IGNORE INTO bands (settings, band, value, hash)
+                VALUES (?, ?, ?, ?)
+                """,
+                [
+                    (settings, band, (photo_hash >> shift) & mask, blob)
+                    for band, (shift, mask) in enumerate(_BANDS)
+                ],
+            )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,230 @@
+import math
+import threading
+import unicodedata
+from typing import Optional
+
+from placefinder.t import QueryNovelty, SearchEstimate, Tile
+
+# A nearby search returns at most 3 pages of 20 results
+MAX_PAGES_PER_QUERY = 3
+MAX_RESULTS_PER_QUERY = 60
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111_320
+
+# Share of new places under which a page is not worth paginating further
+MIN_NOVELTY = 0.2
+# Pages a term overlapping an earlier one is searched before it may be skipped
+PROBE_PAGES = 2
+
+
+class SearchPlanner:
+    """Split a location into tiles searched one by one
+
+    The location starts as a grid of `initial_splits` x `initial_splits` tiles. A tile
+    whose search returns as many results as the API allows probably hides more places,
+    so it is split in four smaller tiles, down to `min_tile_size`. Tiles returning
+    fewer results are not searched any further.
+    """
+
+    def __init__(
+        self,
+        initial_splits: int = 2,
+        min_tile_size: int = 1000,
+        max_results: int = MAX_RESULTS_PER_QUERY,
+    ):
+        """
+        Args:
+            initial_splits (int, optional): Tiles per side of the initial grid
+            min_tile_size (int, optional): Side in meters under which tiles are not split
+            max_results (int, optional): Result count at which a search is saturated
+        """
+        self.initial_splits = max(1, initial_splits)
+        self.min_tile_size = min_tile_size
+        self.max_results = max_results
+
+    @staticmethod
+    def _in_area(tile: Tile, radius: int) -> bool:
+        """Whether the tile overlaps the circle of the location"""
+        half = tile.size / 2
+        dx = max(abs(tile.x) - half, 0)
+        dy = max(abs(tile.y) - half, 0)
+        return math.hypot(dx, dy) < radius
+
+    def tiles(self, radius: int) -> list[Tile]:
+        """Initial grid covering a circle of `radius` meters"""
+        size = 2 * radius / self.initial_splits
+        start = -radius + size / 2
+
+        tiles = [
+            Tile(x=start + i * size, y=start + j * size, size=size)
+            for j in range(self.initial_splits)
+            for i in range(self.initial_splits)
+        ]
+
+        return [tile for tile in tiles if self._in_area(tile, radius)]
+
+    def split(self, tile: Tile, radius: int) -> list[Tile]:
+        """Split a tile in four, nothing when it is already at the minimum size"""
+        size = tile.size / 2
+
+        if size < self.min_tile_size:
+            return []
+
+        tiles = [
+            Tile(
+                x=tile.x + dx * size / 2,
+                y=tile.y + dy * size / 2,
+                size=size,
+                depth=tile.depth + 1,
+            )
+            for dy in (-1, 1)
+            for dx in (-1, 1)
+        ]
+
+        return [child for child in tiles if self._in_area(child, radius)]
+
+    def is_saturated(self, result_count: int) -> bool:
+        """Whether a search returned as many results as the API allows"""
+        return result_count >= self.max_results
+
+    @staticmethod
+    def coords(location_coords: dict, tile: Tile) -> dict:
+        """Center of a tile, as {"lat": ..., "lng": ...}
+
+        Args:
+            location_coords (dict): Center of the location the tile belongs to
+            tile (Tile)
+        """
+        lat = location_coords["lat"] + tile.y / METERS_PER_DEGREE
+        lng = location_coords["lng"] + tile.x / (
+            METERS_PER_DEGREE * math.cos(math.radians(location_coords["lat"]))
+        )
+
+        return {"lat": lat, "lng": lng}
+
+    def estimate(self, radius: int, terms: int) -> SearchEstimate:
+        """Nearby search requests needed, without sending any
+
+        The lower bound assumes no tile is saturated (one page each), the upper bound
+        that every tile is saturated down to the minimum size (all pages each).
+
+        Args:
+            radius (int): Radius of the location in meters
+            terms (int): Number of search terms
+        """
+        initial = self.tiles(radius)
+        max_tiles = 0
+        pending = list(initial)
+
+        while pending:
+            tile = pending.pop()
+            max_tiles += 1
+            pending.extend(self.split(tile, radius))
+
+        return SearchEstimate(
+            terms=terms,
+            initial_tiles=len(initial),
+            max_tiles=max_tiles,
+            min_requests=terms * len(initial),
+            max_requests=terms * max_tiles * MAX_PAGES_PER_QUERY,
+        )
+
+
+def normalize_term(term: str) -> str:
+    """Lowercase a search term and collapse its whitespace"""
+    return " ".join(unicodedata.normalize("NFKC", term).lower().split())
+
+
+class QueryPlanner:
+    """Avoid searches returning places already found
+
+    Terms are normalized and deduplicated. Each page records how many of its results
+    were new: a query stops paginating when a page falls under `min_novelty`, and a
+    term whose words include or are included in those of an earlier term (e.g.
+    "bubble tea shop" after "bubble tea") is skipped altogether once it has been
+    probed for `probe_pages` pages with a novelty under `min_novelty`.
+    """
+
+    def __init__(
+        self, min_novelty: float = MIN_NOVELTY, probe_pages: int = PROBE_PAGES
+    ):
+        """
+        Args:
+            min_novelty (float, optional): Share of new places under which pagination
+                stops, 0 to always paginate
+            probe_pages (int, optional): Pages searched before an overlapping term may
+                be skipped
+        """
+        self.min_novelty = min_novelty
+        self.probe_pages = probe_pages
+        self.lock = threading.Lock()
+        self.novelty: dict[str, QueryNovelty] = {}
+        # Terms in search order, as sets of words
+        self._words: list[tuple[str, frozenset[str]]] = []
+
+    @staticmethod
+    def dedupe(terms: list[str]) -> list[str]:
+        """Normalized terms, without duplicates, in their original order"""
+        return list(
+            dict.fromkeys(normalize_term(term) for term in terms if term.strip())
+        )
+
+    def _get(self, term: str) -> QueryNovelty:
+        term = normalize_term(term)
+        if term not in self.novelty:
+            words = frozenset(term.split())
+            self.novelty[term] = QueryNovelty(
+                term=term,
+                overlaps=next(
+                    (
+                        other
+                        for other, other_words in self._words
+                        if words <= other_words or other_words <= words
+                    ),
+                    None,
+                ),
+            )
+            self._words.append((term, words))
+        return self.novelty[term]
+
+    def record(self, term: str, new: int, results: int) -> bool:
+        """Record a page of a query
+
+        Args:
+            term (str): Search term of the query
+            new (int): Results of the page not found before
+            results (int): Results of the page
+
+        Returns:
+            bool: Whether the query is worth paginating further
+        """
+        with self.lock:
+            novelty = self._get(term)
+            novelty.pages += 1
+            novelty.results += results
+            novelty.new += new
+
+            keep_going = results == 0 or new / results >= self.min_novelty
+            if not keep_going:
+                novelty.stopped += 1
+
+        return keep_going
+
+    def should_skip(self, term: str) -> bool:
+        """Whether an overlapping term has shown too few new places to keep searching"""
+        with self.lock:
+            novelty = self._get(term)
+
+            skip = (
+                novelty.overlaps is not None
+                and novelty.pages >= self.probe_pages
+                and novelty.rate < self.min_novelty
+            )
+            if skip:
+                novelty.skipped += 1
+
+        return skip
+
+    def get(self, term: str) -> Optional[QueryNovelty]:
+        return self.novelty.get(normalize_term(term))
@@ -0,0 +1,171 @@
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+USAGE_PATH = "data/usage.sqlite"
+
+
+class QuotaException(Exception):
+    pass
+
+
+class RequestScheduler:
+    """Keeps track of paid requests per endpoint and enforces monthly quotas
+
+    Usage is stored per calendar month, Google's billing period, so it adds up
+    across runs. Each search term also records how many new places its requests
+    found, which is used to run the most productive terms first.
+    """
+
+    def __init__(
+        self,
+        quotas: dict[str, Optional[int]],
+        prices: dict[str, float],
+        path: Optional[str] = None,
+    ):
+        """
+        Args:
+            quotas (dict[str, int | None]): Monthly requests allowed per endpoint,
+                None meaning unlimited
+            prices (dict[str, float]): Cost of 1000 requests per endpoint
+            path (str, optional): SQLite database file, usage only lasts for the
+                process when None
+        """
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.quotas = quotas
+        self.prices = prices
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            path or ":memory:",
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                month TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                PRIMARY KEY (month, endpoint)
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS yields (
+                term TEXT PRIMARY KEY,
+                requests INTEGER NOT NULL,
+                new_places INTEGER NOT NULL
+            )
+            """
+        )
+
+    @staticmethod
+    def _month() -> str:
+        return datetime.now().strftime("%Y-%m")
+
+    def used(self, endpoint: str) -> int:
+        """Requests sent to an endpoint this month"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT requests FROM usage WHERE month = ? AND endpoint = ?",
+                (self._month(), endpoint),
+            ).fetchone()
+
+        return int(row[0]) if row else 0
+
+    def remaining(self, endpoint: str) -> Optional[int]:
+        """Requests left this month for an endpoint, None if unlimited"""
+        quota = self.quotas.get(endpoint)
+        if quota is None:
+            return None
+
+        return max(0, quota - self.used(endpoint))
+
+    def allows(self, endpoint: str, requests: int = 1) -> bool:
+        """Whether `requests` more requests fit in the endpoint quota"""
+        remaining = self.remaining(endpoint)
+        return remaining is None or requests <= remaining
+
+    def reserve(self, endpoint: str) -> None:
+        """Count a request about to be sent
+
+        Raises:
+            QuotaException: if the endpoint quota is used up
+        """
+        quota = self.quotas.get(endpoint)
+        month = self._month()
+
+        # Checked and counted in one write transaction, processes sharing the
+        # database cannot both take the last request of a quota
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT requests FROM usage WHERE month = ? AND endpoint = ?",
+                    (month, endpoint),
+                ).fetchone()
+                used = int(row[0]) if row else 0
+
+                if quota is not None and used >= quota:
+                    raise QuotaException(
+                        f"Monthly quota of {quota} requests reached for {endpoint}"
+                    )
+
+                self.conn.execute(
+                    """
+                    INSERT INTO usage (month, endpoint, requests) VALUES (?, ?, 1)
+                    ON CONFLICT (month, endpoint) DO UPDATE SET requests = requests + 1
+                    """,
+                    (month, endpoint),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def estimate_cost(self, requests: dict[str, int]) -> float:
+        """Cost of sending the given number of requests per endpoint"""
+        return sum(
+            count * self.prices.get(endpoint, 0) / 1000
+            for endpoint, count in requests.items()
+        )
+
+    def record_yield(self, term: str, new_places: int) -> None:
+        """Record that a request for a search term found `new_places` new places"""
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT INTO yields (term, requests, new_places) VALUES (?, 1, ?)
+                ON CONFLICT (term) DO UPDATE SET
+                    requests = requests + 1,
+                    new_places = new_places + excluded.new_places
+                """,
+                (" ".join(term.lower().split()), new_places),
+            )
+
+    def order_terms(self, terms: list[str]) -> list[str]:
+        """Sort search terms by new places found per request, best first
+
+        Terms never searched come first, as their yield is unknown.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT term, requests, new_places FROM yields"
+            ).fetchall()
+
+        yields = {term: new_places / requests for term, requests, new_places in rows}
+
+        return sorted(
+            terms,
+            key=lambda term: -yields.get(" ".join(term.lower().split()), float("inf")),
+        )
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+RATE_LIMIT_PATH = "data/ratelimit.sqlite"
+
+
+class RateLimiter:
+    """Token bucket shared by every thread sending requests
+
+    Tokens are refilled continuously at `rate` per second, up to `burst` tokens.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate (float): Allowed requests per second
+            burst (int, optional): Requests that can be sent at once after an idle period
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket shared by every process using the same SQLite file
+
+    The bucket state is read and updated in a single write transaction, so
+    processes running at once never send more than `rate` requests per second
+    altogether.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, path: str = RATE_LIMIT_PATH):
+        """
+        Args:
+            rate (float): Allowed requests per second, all processes combined
+            burst (int, optional): Requests that can be sent at once after an idle period
+            path (str, optional): SQLite database file holding the bucket
+        """
+        super().__init__(rate, burst)
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bucket (
+                id INTEGER PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _take(self) -> float:
+        """Take a token if one is available, else the seconds to wait for one"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Wall clock time, as monotonic clocks are not shared between processes
+                now = time.time()
+                row = self.conn.execute(
+                    "SELECT tokens, updated_at FROM bucket WHERE id = 0"
+                ).fetchone()
+
+                tokens = float(self.burst)
+                if row is not None:
+                    tokens = min(tokens, row[0] + max(0, now - row[1]) * self.rate)
+
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / self.rate
+
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO bucket (id, tokens, updated_at) VALUES (0, ?, ?)",
+                    (tokens, now),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+        return wait
+
+    def acquire(self) -> None:
+        """Block until a request may be sent"""
+        while wait := self._take():
+            time.sleep(wait)
+
+    def close(self) -> None:
+        self.conn.close()
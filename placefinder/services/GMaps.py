@@ -1,27 +1,232 @@
+import threading
 import time
-
-import googlemaps
-
-from placefinder import terminal
-from placefinder.env import env
-from placefinder.t import Place, PlacePhoto
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from heapq import heappop, heappush
+from itertools import count
+from typing import Any, Generator, Iterator, Optional
+
+from rich.progress import Progress
+
+from placefinder import error_console, terminal
+from placefinder.cache import Cache, make_key
+from placefinder.env import get_env
+from placefinder.metrics import Metrics, metrics
+from placefinder.planner import QueryPlanner, SearchPlanner
+from placefinder.quota import QuotaException, RequestScheduler
+from placefinder.ratelimit import RateLimiter
+from placefinder.store import PlaceStore
+from placefinder.t import (
+    DetailsPolicy,
+    NearbyQuery,
+    Place,
+    Tile,
+    now_timestamp,
+    validate_places,
+)
 
 MAX_GEOCODING = 10000
 MAX_PLACES_DETAILS_ID = None
 MAX_PLACES_NEARBY_SEARCH = 5000
 
-
-class QuotaException(Exception):
-    pass
+# Monthly requests allowed per endpoint, None meaning unlimited
+QUOTAS: dict[str, Optional[int]] = {
+    "geocode": MAX_GEOCODING,
+    "place": MAX_PLACES_DETAILS_ID,
+    "places_nearby": MAX_PLACES_NEARBY_SEARCH,
+}
+
+# Price of 1000 requests per endpoint, in USD
+PRICES: dict[str, float] = {
+    "geocode": 5.0,
+    "place": 17.0,
+    "places_nearby": 32.0,
+}
+
+# Cache time to live per endpoint, in seconds (None means forever)
+CACHE_TTLS: dict[str, Optional[float]] = {
+    "geocode": None,
+    "places_nearby": 6 * 60 * 60,
+    "place": 7 * 24 * 60 * 60,
+}
+
+# Requests sent to Google, all endpoints and threads combined
+QUERIES_PER_SECOND = 10
+# Place details fetched at once, kept under the HTTP connection pool size (10)
+DETAILS_MAX_WORKERS = 8
+# Nearby search pages requested at once, across every term and tile
+NEARBY_MAX_WORKERS = 4
+# Seconds before a next_page_token is first tried
+PAGE_TOKEN_DELAY = 2.0
+# Each token not valid yet adds PAGE_TOKEN_RETRY_DELAY to the wait of the next ones,
+# up to PAGE_TOKEN_MAX_EXTRA_DELAY. Each token valid on the first try scales the
+# extra wait by PAGE_TOKEN_DECAY. Trying tokens before PAGE_TOKEN_DELAY costs more
+# failed requests than it saves time.
+PAGE_TOKEN_MAX_EXTRA_DELAY = 3.0
+PAGE_TOKEN_DECAY = 0.95
+# Seconds before trying a token again, times the attempts already made
+PAGE_TOKEN_RETRY_DELAY = 0.5
+PAGE_TOKEN_MAX_RETRIES = 5
+
+# Place field: (field requested from place details, key in a nearby search result)
+PLACE_FIELDS: dict[str, tuple[str, Optional[str]]] = {
+    "name": ("name", "name"),
+    "address": ("formatted_address", "vicinity"),
+    "rating": ("rating", "rating"),
+    "total_ratings": ("user_ratings_total", "user_ratings_total"),
+    "photos": ("photo", "photos"),
+    "opening_hours": ("opening_hours", None),
+}
+
+# Nearby search results already hold most fields, place details are only requested
+# for what they lack. The address of a search result ("vicinity") has no postal code,
+# districts then come from the coordinates of the place.
+DETAILS_POLICY: dict[str, DetailsPolicy] = {
+    "name": DetailsPolicy.IF_MISSING,
+    "address": DetailsPolicy.IF_MISSING,
+    "rating": DetailsPolicy.SEARCH,
+    "total_ratings": DetailsPolicy.SEARCH,
+    "photos": DetailsPolicy.SEARCH,
+    "opening_hours": DetailsPolicy.SEARCH,
+}
+
+# Override of DETAILS_POLICY requesting the full address, with its postal code, of
+# every new place: one place details request per place
+FULL_ADDRESS_POLICY: dict[str, DetailsPolicy] = {"address": DetailsPolicy.DETAILS}
+
+# Key of a place details result, for a requested field
+DETAILS_RESULT_KEYS = {"photo": "photos"}
+
+# Stored place, or the future of its missing details, looked up ahead of processing
+Prefetched = tuple[Optional[Place], Optional[Future[dict]]]
+
+
+def _is_invalid_request(e: Exception) -> bool:
+    # Imported here as googlemaps is only loaded once a request is sent
+    from googlemaps.exceptions import ApiError
+
+    return isinstance(e, ApiError) and e.status == "INVALID_REQUEST"
 
 
 class GMapsService:
-    def __init__(self):
-        self.gmaps = googlemaps.Client(key=env.GMAPS_API_KEY.get_secret_value())
+    def __init__(
+        self,
+        cache: Optional[Cache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_workers: int = DETAILS_MAX_WORKERS,
+        nearby_workers: int = NEARBY_MAX_WORKERS,
+        details_policy: Optional[dict[str, DetailsPolicy]] = None,
+        store: Optional[PlaceStore] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        metrics: Metrics = metrics,
+    ):
+        """
+        Args:
+            cache (Cache, optional): Response cache, responses are not cached when None
+            rate_limiter (RateLimiter, optional): Limiter shared by every request,
+                defaults to QUERIES_PER_SECOND
+            max_workers (int, optional): Place details requests in flight at once
+            nearby_workers (int, optional): Nearby search requests in flight at once
+            details_policy (dict[str, DetailsPolicy], optional): Overrides of
+                DETAILS_POLICY, by Place field
+            store (PlaceStore, optional): Places found are saved there, and the fresh
+                ones are reused instead of being fetched again
+            scheduler (RequestScheduler, optional): Counts requests against QUOTAS,
+                defaults to one only counting the requests of this process
+            metrics (Metrics, optional): Where latencies, cache hits and costs are
+                recorded, defaults to the process-wide registry
+        """
+        self._gmaps: Any = None
+        self._gmaps_lock = threading.Lock()
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter(QUERIES_PER_SECOND)
+        self.max_workers = max_workers
+        self.nearby_workers = nearby_workers
+        self.details_policy = DETAILS_POLICY | (details_policy or {})
+        self.store = store
+        self.scheduler = scheduler or RequestScheduler(QUOTAS, PRICES)
+        self.degraded = False
+        self.metrics = metrics
+        self.page_token_delay = PAGE_TOKEN_DELAY
+        # Timestamp of the places found, shared by a whole search
+        self.timestamp = now_timestamp()
+        self._page_token_extra_delay = 0.0
+
+    @property
+    def gmaps(self) -> Any:
+        """Google Maps client, only created once a request is actually sent"""
+        with self._gmaps_lock:
+            if self._gmaps is None:
+                import googlemaps
+
+                env = get_env()
+                self._gmaps = googlemaps.Client(
+                    key=env.GMAPS_API_KEY.get_secret_value(),
+                    base_url=env.GMAPS_BASE_URL,
+                )
+
+        return self._gmaps
+
+    def _lookup(self, endpoint: str, key: dict[str, Any]) -> Optional[Any]:
+        """Cached response of a request, None if there is none"""
+        if self.cache is None:
+            return None
+
+        cached = self.cache.get(endpoint, make_key(**key))
+        if cached is not None:
+            self.metrics.cache_hit(endpoint)
+
+        return cached
+
+    def _send(self, endpoint: str, key: dict[str, Any], **params: Any) -> Any:
+        """Send a request through the request scheduler and the rate limiter, and cache its response
+
+        Raises:
+            QuotaException: if the endpoint monthly quota is used up
+        """
+        self.scheduler.reserve(endpoint)
+        self.rate_limiter.acquire()
+        with self.metrics.timer(endpoint, cost=PRICES.get(endpoint, 0) / 1000):
+            result = getattr(self.gmaps, endpoint)(**params)
+
+        if self.cache is not None:
+            self.cache.set(endpoint, make_key(**key), result)
+
+        return result
+
+    def _request(
+        self,
+        endpoint: str,
+        key: dict[str, Any],
+        refresh: bool = False,
+        **params: Any,
+    ) -> Any:
+        """Call the API through the response cache, the request scheduler and the rate limiter
+
+        Raises:
+            QuotaException: if the endpoint monthly quota is used up
+
+        Args:
+            endpoint (str): Name of the endpoint, used as cache namespace and as the
+                client method performing the request
+            key (dict): Normalized arguments identifying the response
+            refresh (bool, optional): Ignore the cached response, if any
+            **params: Arguments given to the client method
+        """
+        cached = None if refresh else self._lookup(endpoint, key)
+        if cached is not None:
+            return cached
+
+        return self._send(endpoint, key, **params)
 
     def _geocode(self, location: str):
         with terminal.WorkingOnIt(f"[bold green]Geocoding {location}..."):
-            geocode_result = self.gmaps.geocode(location)
+            geocode_result = self._request(
+                "geocode",
+                key={"address": " ".join(location.lower().split())},
+                address=location,
+            )
             if not geocode_result:
                 raise Exception(f"Could not geocode location: {location}")
 
@@ -29,144 +234,643 @@ class GMapsService:
 
         return location_coords
 
-    def _place(self, place_id: str) -> dict:
+    def _place(self, place_id: str, fields: list[str]) -> dict:
         """Get detailed information from a place_id
 
         Args:
             place_id (str)
+            fields (list[str]): Place details fields to request
         """
-        details: dict = self.gmaps.place(
-            place_id,
-            fields=[
-                "name",
-                "formatted_address",
-                "rating",
-                "user_ratings_total",
-                # "opening_hours",
-                "photo",
-            ],
+        details: dict = self._request(
+            "place",
+            key={"place_id": place_id, "fields": sorted(fields)},
+            place_id=place_id,
+            fields=fields,
         )["result"]
 
         return details
 
-    def get_places(
-        self, location: str, search_terms: list[str], radius: int = 10000
-    ) -> list[Place]:
+    def _missing_fields(self, result: dict) -> list[str]:
+        """Place details fields to request for a nearby search result, per the policy"""
+        fields = []
+
+        for field, policy in self.details_policy.items():
+            details_field, search_key = PLACE_FIELDS[field]
+
+            if policy == DetailsPolicy.DETAILS or (
+                policy == DetailsPolicy.IF_MISSING
+                and (search_key is None or not result.get(search_key))
+            ):
+                fields.append(details_field)
+
+        return fields
+
+    def _place_info(self, result: dict, details: dict) -> dict:
+        """Merge a nearby search result and its place details into a raw place"""
+        values = {}
+
+        for field, policy in self.details_policy.items():
+            details_field, search_key = PLACE_FIELDS[field]
+            details_key = DETAILS_RESULT_KEYS.get(details_field, details_field)
+
+            # Once degraded, search results stand in for the details not fetched
+            value = details.get(details_key)
+            if (
+                value is None
+                and search_key
+                and (policy != DetailsPolicy.DETAILS or self.degraded)
+            ):
+                value = result.get(search_key)
+
+            values[field] = value
+
+        opening_hours = values["opening_hours"]
+
+        return {
+            "place_id": result["place_id"],
+            "name": values["name"] or "",
+            "address": values["address"] or "",
+            "rating": values["rating"],
+            "total_ratings": values["total_ratings"],
+            "latitude": result["geometry"]["location"]["lat"],
+            "longitude": result["geometry"]["location"]["lng"],
+            "photos": values["photos"] or [],
+            "opening_hours": "; ".join(opening_hours.get("weekday_text", []))
+            if opening_hours
+            else None,
+        }
+
+    def _details(self, future: Optional[Future[dict]]) -> dict:
+        """Wait for place details, without them once the details quota is used up"""
+        if future is None:
+            return {}
+
+        try:
+            return future.result()
+        except QuotaException as e:
+            if not self.degraded:
+                error_console.print(f"{e}, keeping search results only")
+                self.degraded = True
+            return {}
+
+    def _places_nearby(self, query: NearbyQuery) -> tuple[dict, bool]:
+        """Get the next page of a nearby search
+
+        Pages are cached by their index rather than by `page_token`, which is only
+        valid for a few minutes.
+
+        Returns:
+            tuple[dict, bool]: The page, and whether it came from the cache
         """
-        Searches for places using Google Maps Places API based on given search terms in a specified location.
-        For each place found, retrieves detailed information including name, address, rating, and coordinates.
-        The function shows a progress bar while searching and processing results, handling pagination
-        to get all available results for each search term.
+        key = {
+            "lat": round(query.location["lat"], 6),
+            "lng": round(query.location["lng"], 6),
+            "keyword": " ".join(query.term.lower().split()),
+            "radius": query.radius,
+            "page": query.page,
+        }
+
+        cached = None if query.refresh else self._lookup("places_nearby", key)
+        if cached is not None:
+            return cached, True
+
+        places_result = self._send(
+            "places_nearby",
+            key,
+            location=query.location,
+            keyword=query.term,
+            radius=query.radius,
+            page_token=query.page_token,
+        )
+
+        return places_result, False
+
+    def _prefetch(
+        self,
+        results: list[dict],
+        prefetched: dict[str, Prefetched],
+        executor: ThreadPoolExecutor,
+    ) -> None:
+        """Look up stored places and request missing details, ahead of processing
+
+        Args:
+            results (list[dict]): Search results, those already prefetched are skipped
+            prefetched (dict[str, Prefetched]): Stored place or details future by
+                place_id, updated with the results
+            executor (ThreadPoolExecutor): Pool fetching place details
+        """
+        results = list(
+            {
+                result["place_id"]: result
+                for result in results
+                if result["place_id"] not in prefetched
+            }.values()
+        )
+        if not results:
+            return
+
+        # Places stored recently enough are not fetched again
+        stored = (
+            self.store.get_fresh([result["place_id"] for result in results])
+            if self.store is not None
+            else {}
+        )
+
+        for result in results:
+            place = stored.get(result["place_id"])
+            fields = self._missing_fields(result) if place is None else []
+            prefetched[result["place_id"]] = (
+                place,
+                executor.submit(self._place, result["place_id"], fields)
+                if fields
+                else None,
+            )
+
+    def _process_page(
+        self,
+        query: NearbyQuery,
+        page: int,
+        places_result: dict,
+        seen: set[str],
+        prefetched: dict[str, Prefetched],
+        progress: Progress,
+        executor: ThreadPoolExecutor,
+        query_planner: Optional[QueryPlanner],
+    ) -> Generator[Place, None, bool]:
+        """Build the new places of a nearby search page
+
+        Args:
+            query (NearbyQuery): Query the page belongs to, its result count is updated
+            page (int): Index of the page, the next one to process of the query
+            places_result (dict): Page of the nearby search
+            seen (set[str]): place_ids already found, updated with the new ones
+            prefetched (dict[str, Prefetched]): Stored places and details requested
+                when the page arrived, see `_prefetch`. Those of the new places are
+                taken out.
+            progress (Progress): Progress bar to report on
+            executor (ThreadPoolExecutor): Pool fetching place details
+            query_planner (QueryPlanner, optional): Stops paginating once a page
+                brings too few new places
+
+        Yields:
+            Place: New places, in page order once the whole page is fetched
+
+        Returns:
+            bool: Whether the query is worth paginating further
+        """
+        results = places_result.get("results", [])
+        query.result_count += len(results)
+
+        place_task = progress.add_task(
+            f"[cyan]Processing '{query.term}' page {page + 1} results...",
+            total=len(results),
+        )
+
+        new_results = []
+        for result in results:
+            if result["place_id"] in seen:
+                progress.update(place_task, advance=1)
+                continue
+
+            seen.add(result["place_id"])
+            new_results.append(result)
+
+        self.scheduler.record_yield(query.term, len(new_results))
+        keep_going = (
+            query_planner.record(query.term, len(new_results), len(results))
+            if query_planner is not None
+            else True
+        )
+        query.pages_processed = page + 1
+
+        # Details of the new places were requested when the page arrived, results are
+        # read back in page order
+        self._prefetch(new_results, prefetched, executor)
+
+        # Wait for the details of each place, the page is then validated at once
+        stored: list[Optional[Place]] = []
+        raws = []
+        for result in new_results:
+            place, future = prefetched.pop(result["place_id"])
+            stored.append(place)
+
+            if place is None:
+                raws.append(self._place_info(result, self._details(future)))
+
+            progress.update(place_task, advance=1)
+
+        fetched = self.sanitize(raws)
+        if self.store is not None:
+            self.store.upsert_many(fetched)
+
+        built = iter(fetched)
+        for place in stored:
+            yield place if place is not None else next(built)
+
+        progress.remove_task(place_task)
+
+        return keep_going
+
+    def _retry(self, query: NearbyQuery, error: Exception) -> Optional[float]:
+        """Prepare a query whose page request failed to be sent again
+
+        Returns:
+            float | None: Seconds to wait before sending it, None if it should not be
+        """
+        if not _is_invalid_request(error) or query.page == 0:
+            return None
+
+        if query.token_cached:
+            if query.refresh:
+                return None
+
+            # The token came from a cached page and expired, start over live
+            self.metrics.retry("places_nearby")
+            query.page = 0
+            query.page_token = None
+            query.refresh = True
+            query.token_at = time.monotonic()
+            return 0
+
+        if query.attempts >= PAGE_TOKEN_MAX_RETRIES:
+            return None
+
+        # The token is not valid yet, try again a bit later, and wait longer for
+        # the next tokens
+        self.metrics.retry("places_nearby")
+        query.attempts += 1
+        self._page_token_extra_delay = min(
+            PAGE_TOKEN_MAX_EXTRA_DELAY,
+            self._page_token_extra_delay + PAGE_TOKEN_RETRY_DELAY,
+        )
+        return PAGE_TOKEN_RETRY_DELAY * query.attempts
+
+    def _ready_at(self, query: NearbyQuery) -> float:
+        """When the next page of a query may be requested, in time.monotonic() seconds
+
+        A fresh token needs a moment before it becomes valid. One from a cached page
+        is tried right away: either the next page is cached too, or the token has
+        long expired.
+        """
+        if query.page_token is None or query.token_cached:
+            return query.token_at
+
+        return query.token_at + self.page_token_delay + self._page_token_extra_delay
+
+    def iter_places(
+        self,
+        location: str,
+        search_terms: list[str],
+        radius: int = 10000,
+        planner: Optional[SearchPlanner] = None,
+        progress: Optional[Progress] = None,
+        query_planner: Optional[QueryPlanner] = None,
+    ) -> Iterator[Place]:
+        """
+        Streaming variant of `get_places`, yielding places as soon as their page is fetched.
+
+        The location is geocoded right away, the search itself only runs as places are consumed.
 
         Args:
             location (str): Location to search in (e.g., "Paris, France")
             search_terms (list[str]): List of search terms to find places
             radius (int, optional): Search radius in meters. Defaults to 10000.
+            planner (SearchPlanner, optional): Split the area into tiles, see `get_places`
+            progress (Progress, optional): Progress bar to report on, started and stopped
+                by the caller. A new one is shown during the search when None.
+            query_planner (QueryPlanner, optional): Deduplicates the terms, and skips
+                pages and terms bringing too few new places, see `get_places`
         """
-        all_places: list[dict] = []
         location_coords = self._geocode(location)
-
-        with terminal.ProgressBar() as progress:
+        self.timestamp = now_timestamp()
+
+        return self._stream_places(
+            location,
+            location_coords,
+            search_terms,
+            radius,
+            planner,
+            progress,
+            query_planner,
+        )
+
+    def _stream_places(
+        self,
+        location: str,
+        location_coords: dict,
+        search_terms: list[str],
+        radius: int,
+        planner: Optional[SearchPlanner],
+        progress: Optional[Progress],
+        query_planner: Optional[QueryPlanner],
+    ) -> Iterator[Place]:
+        """Run the nearby searches of every term, pipelined
+
+        Up to `nearby_workers` pages are requested at once. While the next_page_token
+        of a query matures, the first pages of other queries are requested, rather
+        than sleeping.
+
+        Pages are processed in a fixed order whatever order they arrive in: query
+        after query, in the order they were planned, and page after page. So places
+        come out, and queries are credited with them, the same way on every run. The
+        next page of a query is requested ahead of processing unless the page
+        already brings too few new places, while skipping a term and stopping a query
+        are only decided when processing.
+
+        The details of the places a page brings are requested as soon as it arrives,
+        so they are fetched while earlier queries wait for their next page. Only
+        places found already are left out, a place may still turn out to be found
+        by an earlier query, whose page then uses the same details. A page requested
+        ahead and dropped, as its query stops early, costs the details of its places.
+        """
+        seen: set[str] = set()
+        # Stored places and details futures by place_id, from the pages received
+        prefetched: dict[str, Prefetched] = {}
+        if query_planner is not None:
+            search_terms = query_planner.dedupe(search_terms)
+        # Most productive terms first, so a quota running out costs the least places
+        search_terms = self.scheduler.order_terms(search_terms)
+
+        # Queries not requested yet, in the order they were planned
+        queries: deque[NearbyQuery] = deque()
+        # Queries not processed entirely, by seq, in the order they were planned
+        unfinished: dict[int, NearbyQuery] = {}
+        planned = count()
+
+        def plan(term: str, coords: dict, radius: int, tile: Optional[Tile]) -> None:
+            query = NearbyQuery(
+                term=term, location=coords, radius=radius, tile=tile, seq=next(planned)
+            )
+            queries.append(query)
+            unfinished[query.seq] = query
+
+        for term in search_terms:
+            if planner is None:
+                plan(term, location_coords, radius, None)
+                continue
+
+            for tile in planner.tiles(radius):
+                plan(term, planner.coords(location_coords, tile), tile.radius, tile)
+
+        # Queries left per term, a term is done once none is left
+        remaining = Counter(query.term for query in queries)
+        # Queries waiting for their next_page_token, as (ready at, order, query)
+        maturing: list[tuple[float, int, NearbyQuery]] = []
+        in_flight: dict[Future[tuple[dict, bool]], NearbyQuery] = {}
+        order = count()
+        # Pages received and not processed yet, as (page, cached, received at), by
+        # (seq, page index)
+        received: dict[tuple[int, int], tuple[dict, bool, float]] = {}
+        # Queries whose next page is not requested, until processing asks for it
+        idle: set[int] = set()
+        # Queries whose term was checked against QueryPlanner.should_skip
+        checked: set[int] = set()
+
+        with (
+            nullcontext(progress) if progress else terminal.ProgressBar() as progress,
+            ThreadPoolExecutor(max_workers=self.max_workers) as executor,
+            ThreadPoolExecutor(max_workers=self.nearby_workers) as nearby_executor,
+        ):
             search_task = progress.add_task(
                 f"[yellow]Searching for places in {location} ...",
                 total=len(search_terms),
             )
 
-            for term in search_terms:
-                progress.update(
-                    search_task, description=f"[yellow]Searching with '{term}' ..."
-                )
+            def request(
+                query: NearbyQuery,
+                page_token: Optional[str],
+                cached: bool,
+                token_at: float,
+            ) -> None:
+                # Queue the page after the last one requested
+                idle.discard(query.seq)
+                if page_token is not None:
+                    query.page += 1
+                query.page_token = page_token
+                query.token_cached = cached
+                query.token_at = token_at
+                query.attempts = 0
+                heappush(maturing, (self._ready_at(query), next(order), query))
+
+            def worth_requesting(query: NearbyQuery, places_result: dict) -> bool:
+                # Places only get known, a page bringing too few new places now will
+                # when processed, and stop its query
+                if query_planner is None or query.page < query.pages_processed:
+                    return True
+                results = places_result.get("results", [])
+                new = sum(result["place_id"] not in seen for result in results)
+                return not results or new / len(results) >= query_planner.min_novelty
+
+            def finish(query: NearbyQuery) -> None:
+                query.stopped = True
+                del unfinished[query.seq]
+                idle.discard(query.seq)
+                for key in [key for key in received if key[0] == query.seq]:
+                    del received[key]
+
+                # Only a search returning as many results as the API allows may hide
+                # more. One stopped for bringing too few new places is not split, the
+                # smaller tiles would search the same ground for the same term.
+                if (
+                    planner is not None
+                    and query.tile is not None
+                    and planner.is_saturated(query.result_count)
+                ):
+                    for tile in planner.split(query.tile, radius):
+                        plan(
+                            query.term,
+                            planner.coords(location_coords, tile),
+                            tile.radius,
+                            tile,
+                        )
+                        remaining[query.term] += 1
 
-                # Token for pagination
-                page_token = None
-                page_count = 0
-
-                while True:
-                    # Perform the search
-                    places_result: dict = self.gmaps.places_nearby(
-                        location=location_coords,
-                        keyword=term,
-                        radius=radius,
-                        page_token=page_token,
+                remaining[query.term] -= 1
+                if not remaining[query.term]:
+                    progress.update(search_task, advance=1)
+
+            while unfinished:
+                # Process the pages received in order, until one is missing
+                while unfinished:
+                    query = next(iter(unfinished.values()))
+
+                    if query.seq not in checked:
+                        checked.add(query.seq)
+                        if query_planner is not None and query_planner.should_skip(
+                            query.term
+                        ):
+                            finish(query)
+                            continue
+
+                    page = query.pages_processed
+                    if (query.seq, page) not in received:
+                        if query.seq in idle:
+                            if page:
+                                # A restart found fewer pages than processed already
+                                finish(query)
+                                continue
+                            # Not requested as its term looked like being skipped
+                            request(query, None, False, time.monotonic())
+                        break
+
+                    places_result, cached, received_at = received.pop((query.seq, page))
+                    progress.update(
+                        search_task,
+                        description=f"[yellow]Searching with '{query.term}' ...",
+                    )
+
+                    keep_going = yield from self._process_page(
+                        query,
+                        page,
+                        places_result,
+                        seen,
+                        prefetched,
+                        progress,
+                        executor,
+                        query_planner,
                     )
 
-                    results = places_result.get("results", [])
-                    page_count += 1
+                    page_token = places_result.get("next_page_token")
 
-                    place_task = progress.add_task(
-                        f"[cyan]Processing page {page_count} results...",
-                        total=len(results),
+                    # If no more pages, or they would mostly hold known places
+                    if not page_token or not keep_going:
+                        finish(query)
+                    elif query.seq in idle and query.page == page:
+                        # It was not requested ahead
+                        request(query, page_token, cached, received_at)
+
+                now = time.monotonic()
+
+                # Matured tokens first, they expire when kept waiting
+                while (
+                    maturing
+                    and maturing[0][0] <= now
+                    and len(in_flight) < self.nearby_workers
+                ):
+                    ready_at, _, query = heappop(maturing)
+                    if query.stopped:
+                        continue
+
+                    # Tokens failed since it was queued, it should wait longer
+                    if self._ready_at(query) > ready_at:
+                        heappush(maturing, (self._ready_at(query), next(order), query))
+                        continue
+
+                    in_flight[nearby_executor.submit(self._places_nearby, query)] = (
+                        query
                     )
 
-                    # Process each place
-                    for result in results:
-                        progress.update(place_task, advance=1)
+                while queries and len(in_flight) < self.nearby_workers:
+                    query = queries.popleft()
+                    if query.stopped:
+                        continue
 
-                        if any(
-                            [
-                                result["place_id"] == place["place_id"]
-                                for place in all_places
-                            ]
-                        ):
-                            continue
+                    # Checked again when processing, the term may prove worth it
+                    if query_planner is not None and query_planner.should_skip(
+                        query.term
+                    ):
+                        idle.add(query.seq)
+                        continue
 
-                        details = self._place(result["place_id"])
+                    in_flight[nearby_executor.submit(self._places_nearby, query)] = (
+                        query
+                    )
 
-                        place_info = {
-                            "place_id": result["place_id"],
-                            "name": details.get("name", ""),
-                            "address": details.get("formatted_address", ""),
-                            "rating": details.get("rating"),
-                            "total_ratings": details.get("user_ratings_total"),
-                            "latitude": result["geometry"]["location"]["lat"],
-                            "longitude": result["geometry"]["location"]["lng"],
-                            "photos": details.get("photos", []),
-                            # "opening_hours": "; ".join(
-                            #     details.get("opening_hours", {}).get("weekday_text", [])
-                            # )
-                        }
+                if not in_flight:
+                    if maturing:
+                        time.sleep(max(0, maturing[0][0] - time.monotonic()))
+                    continue
 
-                        all_places.append(place_info)
+                done, _ = wait(
+                    in_flight,
+                    timeout=max(0, maturing[0][0] - now) if maturing else None,
+                    return_when=FIRST_COMPLETED,
+                )
 
-                    progress.remove_task(place_task)
+                for future in done:
+                    query = in_flight.pop(future)
 
-                    # Get the next page token
-                    page_token = places_result.get("next_page_token")
+                    try:
+                        places_result, cached = future.result()
+                    except Exception as e:
+                        if query.stopped:
+                            continue
 
-                    # If no more pages, break the loop
-                    if not page_token:
-                        break
+                        delay = self._retry(query, e)
+                        if delay is None:
+                            raise
 
-                    # Sleep to avoid hitting rate limits
-                    time.sleep(2)
+                        ready_at = max(time.monotonic() + delay, self._ready_at(query))
+                        heappush(maturing, (ready_at, next(order), query))
+                        continue
 
-                progress.update(search_task, advance=1)
+                    if query.stopped:
+                        continue
 
-        return self.sanitize(all_places)
+                    if query.page_token and not cached and not query.attempts:
+                        # The token was valid on the first try, it may be used sooner
+                        self._page_token_extra_delay *= PAGE_TOKEN_DECAY
 
-    def sanitize(self, raws: list[dict]) -> list[Place]:
-        places: list[Place] = []
-
-        for raw in raws:
-            places.append(
-                Place(
-                    place_id=raw["place_id"],
-                    name=raw["name"],
-                    address=raw["address"],
-                    rating=raw["rating"],
-                    total_ratings=raw["total_ratings"],
-                    latitude=raw["latitude"],
-                    longitude=raw["longitude"],
-                    photos=[
-                        PlacePhoto(
-                            height=raw_photo_data["height"],
-                            width=raw_photo_data["width"],
-                            photo_reference=raw_photo_data["photo_reference"],
-                            html_attributions=raw_photo_data["html_attributions"],
+                    now = time.monotonic()
+                    # A restarted query requests processed pages again, for their token
+                    if query.page >= query.pages_processed:
+                        received[query.seq, query.page] = (places_result, cached, now)
+                        self._prefetch(
+                            [
+                                result
+                                for result in places_result.get("results", [])
+                                if result["place_id"] not in seen
+                            ],
+                            prefetched,
+                            executor,
                         )
-                        for raw_photo_data in raw["photos"]
-                    ],
-                )
+
+                    page_token = places_result.get("next_page_token")
+                    if page_token and worth_requesting(query, places_result):
+                        request(query, page_token, cached, now)
+                    else:
+                        idle.add(query.seq)
+
+            progress.remove_task(search_task)
+
+    def get_places(
+        self,
+        location: str,
+        search_terms: list[str],
+        radius: int = 10000,
+        planner: Optional[SearchPlanner] = None,
+        query_planner: Optional[QueryPlanner] = None,
+    ) -> list[Place]:
+        """
+        Searches for places using Google Maps Places API based on given search terms in a specified location.
+        For each place found, retrieves detailed information including name, address, rating, and coordinates.
+        Place details are only requested for the fields the details policy asks for, and those of a page
+        are fetched concurrently, limited by `max_workers` and the shared rate limiter.
+        The function shows a progress bar while searching and processing results, handling pagination
+        to get all available results for each search term.
+
+        Args:
+            location (str): Location to search in (e.g., "Paris, France")
+            search_terms (list[str]): List of search terms to find places
+            radius (int, optional): Search radius in meters. Defaults to 10000.
+            planner (SearchPlanner, optional): Split the area into tiles, searched one by one
+                and subdivided when a search hits the result cap. When None, a single search
+                covers the whole radius.
+            query_planner (QueryPlanner, optional): Normalize and deduplicate the terms,
+                stop paginating a query once a page brings too few new places, and skip
+                a term overlapping an earlier one once it has proven to bring too few.
+                A tile whose query stopped early is not split.
+        """
+        return list(
+            self.iter_places(
+                location,
+                search_terms,
+                radius,
+                planner,
+                query_planner=query_planner,
             )
+        )
 
-        return places
+    def sanitize(self, raws: list[dict]) -> list[Place]:
+        """Validate raw places at once, timestamped with the current search"""
+        return validate_places(raws, self.timestamp)
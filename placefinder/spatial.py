@@ -0,0 +1,187 @@
+import heapq
+import math
+from array import array
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from placefinder.planner import METERS_PER_DEGREE
+from placefinder.t import DensityCell
+
+# Side of the grid cells, in meters. Radius queries of a few hundred meters read
+# a handful of cells, each holding a few hundred places in a dense city center.
+GRID_CELL_SIZE = 250
+
+Cell = tuple[int, int]
+
+
+def distance(
+    latitude: float, longitude: float, other_latitude: float, other_longitude: float
+) -> float:
+    """Distance between two close points, in meters"""
+    scale = METERS_PER_DEGREE * math.cos(math.radians((latitude + other_latitude) / 2))
+    return math.hypot(
+        (longitude - other_longitude) * scale,
+        (latitude - other_latitude) * METERS_PER_DEGREE,
+    )
+
+
+class SpatialGrid:
+    """Grid index of points, for radius, nearest neighbour and density queries
+
+    Points are projected on a plane, equirectangular around the latitude of the
+    first point, and bucketed in square cells. Points are identified by their
+    insertion index, which PlaceCollection keeps equal to the index of the place.
+    Distances are in meters, and only accurate within a city.
+    """
+
+    def __init__(self, cell_size: int = GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        # Meters per degree of longitude, set by the first point
+        self.scale = 0.0
+        self.x = array("d")
+        self.y = array("d")
+        self.cells: dict[Cell, list[int]] = defaultdict(list)
+        # Bounds of the cells holding points, inclusive
+        self.min_cell = (0, 0)
+        self.max_cell = (0, 0)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def _project(self, latitude: float, longitude: float) -> tuple[float, float]:
+        return longitude * self.scale, latitude * METERS_PER_DEGREE
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def extend(self, coordinates: Iterable[tuple[float, float]]) -> None:
+        """Add points, as (latitude, longitude)"""
+        for latitude, longitude in coordinates:
+            if not self.scale:
+                self.scale = METERS_PER_DEGREE * math.cos(math.radians(latitude))
+
+            x, y = self._project(latitude, longitude)
+            i, j = cell = self._cell(x, y)
+
+            if not self.x:
+                self.min_cell = self.max_cell = cell
+            else:
+                self.min_cell = (min(self.min_cell[0], i), min(self.min_cell[1], j))
+                self.max_cell = (max(self.max_cell[0], i), max(self.max_cell[1], j))
+
+            self.cells[cell].append(len(self.x))
+            self.x.append(x)
+            self.y.append(y)
+
+    def _ring(self, center: Cell, r: int) -> Iterable[list[int]]:
+        """Points of the cells at Chebyshev distance r of a cell"""
+        cx, cy = center
+        for i in range(cx - r, cx + r + 1):
+            for j in range(cy - r, cy + r + 1):
+                if max(abs(i - cx), abs(j - cy)) == r and (i, j) in self.cells:
+                    yield self.cells[i, j]
+
+    def within(
+        self, latitude: float, longitude: float, radius: float
+    ) -> list[tuple[float, int]]:
+        """Points within `radius` meters, as (distance, index) from the nearest"""
+        if not self.x:
+            return []
+
+        x, y = self._project(latitude, longitude)
+        (x0, y0), (x1, y1) = (
+            self._cell(x - radius, y - radius),
+            self._cell(x + radius, y + radius),
+        )
+        found = []
+
+        for i in range(x0, x1 + 1):
+            for j in range(y0, y1 + 1):
+                for index in self.cells.get((i, j), ()):
+                    distance = math.hypot(self.x[index] - x, self.y[index] - y)
+                    if distance <= radius:
+                        found.append((distance, index))
+
+        found.sort()
+        return found
+
+    def nearest(
+        self, latitude: float, longitude: float, k: int
+    ) -> list[tuple[float, int]]:
+        """The k nearest points, as (distance, index) from the nearest
+
+        Rings of cells are searched outwards until the next ring can only hold
+        points farther than the k-th nearest found so far.
+        """
+        if not self.x or k <= 0:
+            return []
+
+        x, y = self._project(latitude, longitude)
+        center = self._cell(x, y)
+        # Rings beyond this one hold no point
+        last = max(
+            center[0] - self.min_cell[0],
+            self.max_cell[0] - center[0],
+            center[1] - self.min_cell[1],
+            self.max_cell[1] - center[1],
+        )
+        # Max-heap of the k nearest so far, as (-distance, -index)
+        best: list[tuple[float, int]] = []
+
+        for r in range(last + 1):
+            # Points outside rings 0..r-1 are at least this far from the point
+            bound = (r - 1) * self.cell_size + min(
+                x - center[0] * self.cell_size,
+                (center[0] + 1) * self.cell_size - x,
+                y - center[1] * self.cell_size,
+                (center[1] + 1) * self.cell_size - y,
+            )
+            if len(best) == k and -best[0][0] <= bound:
+                break
+
+            for indexes in self._ring(center, r):
+                for index in indexes:
+                    item = (-math.hypot(self.x[index] - x, self.y[index] - y), -index)
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+
+        return sorted((-distance, -index) for distance, index in best)
+
+    def density(
+        self, cell_size: int, top: Optional[int] = None
+    ) -> list[tuple[DensityCell, list[int]]]:
+        """Squares of `cell_size` meters holding the most points, from the densest
+
+        The size is rounded to a multiple of the grid cells.
+
+        Returns:
+            list[tuple[DensityCell, list[int]]]: Each square, and its points
+        """
+        factor = max(1, round(cell_size / self.cell_size))
+        size = factor * self.cell_size
+        counts: dict[Cell, int] = defaultdict(int)
+
+        for i, j in self.cells:
+            counts[i // factor, j // factor] += len(self.cells[i, j])
+
+        ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        squares = []
+
+        for (i, j), count in ordered if top is None else ordered[:top]:
+            indexes = [
+                index
+                for di in range(factor)
+                for dj in range(factor)
+                for index in self.cells.get((i * factor + di, j * factor + dj), ())
+            ]
+            square = DensityCell(
+                latitude=(j + 0.5) * size / METERS_PER_DEGREE,
+                longitude=(i + 0.5) * size / self.scale,
+                size=size,
+                count=count,
+            )
+            squares.append((square, sorted(indexes)))
+
+        return squares
@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from placefinder.t import Place, load_places
+
+STORE_PATH = "data/places.sqlite"
+
+# Stored places older than this are fetched again, in seconds
+STORE_MAX_AGE = 30 * 24 * 60 * 60
+# Places loaded at once when iterating over the store
+STORE_BATCH_SIZE = 10_000
+
+
+class PlaceStore:
+    """Places kept across runs in SQLite, keyed by place_id
+
+    Each place records when it was first seen and last refreshed, so a run only
+    needs to fetch places that are new or stale.
+    """
+
+    def __init__(self, path: str = STORE_PATH, max_age: float = STORE_MAX_AGE):
+        """
+        Args:
+            path (str): SQLite database file, created if missing
+            max_age (float, optional): Age in seconds after which a place is stale
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # Batch worker processes share the file, wait for their writes
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS places (
+                place_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_refreshed REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT COUNT(*) FROM places").fetchone()
+        return int(row[0])
+
+    def get_fresh(self, place_ids: list[str]) -> dict[str, Place]:
+        """Stored places among `place_ids` refreshed less than `max_age` ago"""
+        if not place_ids:
+            return {}
+
+        placeholders = ",".join("?" * len(place_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT place_id, data FROM places
+                WHERE place_id IN ({placeholders}) AND last_refreshed >= ?
+                """,
+                (*place_ids, time.time() - self.max_age),
+            ).fetchall()
+
+        places = load_places([data for _, data in rows])
+        return {place.place_id: place for place in places}
+
+    def upsert_many(self, places: Iterable[Place]) -> int:
+        """Insert or refresh places in a single transaction, keeping their first_seen
+
+        A refreshed place keeps the menu terms read on its photos by earlier runs,
+        the API does not return them.
+
+        Returns:
+            int: Number of places written
+        """
+        now = time.time()
+        rows = [(place.place_id, place.model_dump_json(), now, now) for place in places]
+
+        if not rows:
+            return 0
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO places (place_id, data, first_seen, last_refreshed)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (place_id) DO UPDATE SET
+                    data = json_set(excluded.data, '$.menu_terms', json((
+                        SELECT json_group_array(value) FROM (
+                            SELECT value FROM json_each(excluded.data, '$.menu_terms')
+                            UNION
+                            SELECT value FROM json_each(places.data, '$.menu_terms')
+                            ORDER BY value
+                        )
+                    ))),
+                    last_refreshed = excluded.last_refreshed
+                """,
+                rows,
+            )
+
+        return len(rows)
+
+    def update_many(self, places: Iterable[Place]) -> int:
+        """Save changes made to stored places, e.g. their menu terms, without
+        counting as a refresh
+
+        Returns:
+            int: Number of places updated
+        """
+        rows = [(place.model_dump_json(), place.place_id) for place in places]
+
+        with self.lock, self.conn:
+            return self.conn.executemany(
+                "UPDATE places SET data = ? WHERE place_id = ?", rows
+            ).rowcount
+
+    def iter_places(self, since: Optional[float] = None) -> Iterator[Place]:
+        """Stored places, optionally only those refreshed after a timestamp
+
+        Places are read and validated by batches of STORE_BATCH_SIZE.
+        """
+        last_rowid = 0
+
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    """
+                    SELECT rowid, data FROM places
+                    WHERE rowid > ? AND last_refreshed >= ?
+                    ORDER BY rowid LIMIT ?
+                    """,
+                    (last_rowid, since or 0, STORE_BATCH_SIZE),
+                ).fetchall()
+
+            if not rows:
+                return
+
+            last_rowid = rows[-1][0]
+            yield from load_places([data for _, data in rows])
+
+    def close(self) -> None:
+        self.conn.close()
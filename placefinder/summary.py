@@ -1,11 +1,20 @@
+from typing import Optional
+
 from rich import box
+from rich.console import Group
+from rich.live import Live
+from rich.progress import Progress
 from rich.table import Table
+from rich.text import Text
 
 from placefinder import console
-from placefinder.t import PlaceCollection
+from placefinder.metrics import Metrics
+from placefinder.planner import MAX_PAGES_PER_QUERY, QueryPlanner, SearchPlanner
+from placefinder.quota import RequestScheduler
+from placefinder.t import DuplicateGroup, Location, PlaceCollection
 
 
-def rating_distribution(collection: PlaceCollection):
+def rating_distribution(collection: PlaceCollection, columnar: bool = False):
     total_places = len(collection.places)
 
     console.print("\n[bold]Rating Distribution:[/]")
@@ -14,7 +23,11 @@ def rating_distribution(collection: PlaceCollection):
     rating_table.add_column("Count", justify="right")
     rating_table.add_column("Percentage", justify="right")
 
-    rating_counts = collection.get_rating_distribution()
+    rating_counts = (
+        collection.columnar().rating_distribution()
+        if columnar
+        else collection.get_rating_distribution()
+    )
 
     for label, count in rating_counts.items():
         percentage = (count / total_places) * 100 if total_places > 0 else 0
@@ -38,10 +51,15 @@ def rating_distribution(collection: PlaceCollection):
     console.print(rating_table)
 
 
-def top_places(collection: PlaceCollection, top: int):
-    console.print(f"\n[bold]Top {top} Rated Places:[/]")
-
-    top_places = collection.get_top_rated(top)
+def top_places_table(
+    collection: PlaceCollection, top: int, columnar: bool = False
+) -> Table:
+    if columnar:
+        top_places = [
+            collection.places[index] for index in collection.columnar().top_rated(top)
+        ]
+    else:
+        top_places = collection.get_top_rated(top)
 
     place_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
     place_table.add_column("Name")
@@ -68,30 +86,225 @@ def top_places(collection: PlaceCollection, top: int):
             place.address,
         )
 
-    console.print(place_table)
+    return place_table
+
+
+def top_places(collection: PlaceCollection, top: int, columnar: bool = False):
+    console.print(f"\n[bold]Top {top} Rated Places:[/]")
+    console.print(top_places_table(collection, top, columnar))
+
+
+def live_summary(collection: PlaceCollection, progress: Progress, top: int) -> Live:
+    """Display the progress bar above the top places, refreshed as the collection grows
+
+    Args:
+        collection (PlaceCollection): Collection being filled
+        progress (Progress): Progress bar of the search, started by the returned Live
+        top (int): Number of top places shown
+    """
+    return Live(
+        console=console,
+        get_renderable=lambda: Group(
+            progress,
+            Text(f"Top {top} Rated Places ({len(collection)} found):", style="bold"),
+            top_places_table(collection, top),
+        ),
+    )
+
+
+def district_distribution(
+    collection: PlaceCollection, location: Location, columnar: bool = False
+):
+    if collection.districts is None:
+        console.print(f"\n[grey70]No district data for {location}[/]")
+        return
+
+    console.print(f"\n[bold]Distribution by {location.district_label}:[/]")
+
+    districts = (
+        collection.columnar().district_distribution()
+        if columnar
+        else collection.get_district_distribution()
+    )
+    total_places = len(collection.places)
+
+    district_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    district_table.add_column(location.district_label)
+    district_table.add_column("Count", justify="right")
+    district_table.add_column("Percentage", justify="right")
+
+    for district, count in districts.items():
+        percentage = (count / total_places) * 100 if total_places > 0 else 0
+        district_table.add_row(district, str(count), f"{percentage:.1f}%")
+
+    outside = total_places - sum(districts.values())
+    if outside:
+        percentage = (outside / total_places) * 100
+        district_table.add_row(
+            "[grey70]Outside[/]",
+            f"[grey70]{outside}[/]",
+            f"[grey70]{percentage:.1f}%[/]",
+        )
+
+    console.print(district_table)
+
+
+def density_hotspots(collection: PlaceCollection, top: int = 5, cell_size: int = 500):
+    squares = collection.get_density(cell_size, top)
+    if not squares:
+        return
+
+    console.print(f"\n[bold]Densest areas ({squares[0].size} m squares):[/]")
+
+    density_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    density_table.add_column("Center")
+    density_table.add_column("Places", justify="right")
+    density_table.add_column("Mean rating", justify="right")
+
+    for square in squares:
+        density_table.add_row(
+            f"{square.latitude:.5f}, {square.longitude:.5f}",
+            str(square.count),
+            "-" if square.mean_rating is None else f"{square.mean_rating:.2f}",
+        )
+
+    console.print(density_table)
 
 
-def district_distribution(collection: PlaceCollection, location: str):
-    if "paris" in location.lower():
-        console.print("\n[bold]Distribution by Paris Arrondissement:[/]")
+def duplicate_groups(groups: list[DuplicateGroup], top: int = 10):
+    if not groups:
+        return
 
-        # Get district distribution
-        districts = collection.get_district_distribution()
+    places = sum(len(group.place_ids) for group in groups)
+    console.print(
+        f"\n[bold]Probable duplicates:[/] [yellow]{places}[/] places in "
+        f"[yellow]{len(groups)}[/] groups, kept in the collection"
+    )
 
-        if districts:
-            district_table = Table(
-                show_header=True, header_style="bold cyan", box=box.ROUNDED
-            )
-            district_table.add_column("Arrondissement")
-            district_table.add_column("Count", justify="right")
+    duplicate_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    duplicate_table.add_column("Names")
+    duplicate_table.add_column("Places", justify="right")
+    duplicate_table.add_column("Distance", justify="right")
+    duplicate_table.add_column("Similarity", justify="right")
+
+    for group in groups[:top]:
+        duplicate_table.add_row(
+            " / ".join(dict.fromkeys(group.names)),
+            str(len(group.place_ids)),
+            f"{group.distance:.0f} m",
+            f"{group.similarity:.2f}",
+        )
 
-            for district, count in sorted(districts.items(), key=lambda x: int(x[0])):
-                district_table.add_row(
-                    f"{district}{'th' if district not in ['01', '1'] else 'st'}",
-                    str(count),
-                )
+    console.print(duplicate_table)
 
-            console.print(district_table)
 
+def search_plan(
+    location: str,
+    search_terms: list[str],
+    planner: Optional[SearchPlanner],
+    radius: int,
+    scheduler: Optional[RequestScheduler] = None,
+):
+    console.print(f"\n[bold]Search plan for {location}:[/]")
+
+    plan_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    plan_table.add_column("Search terms", justify="right")
+    plan_table.add_column("Tiles", justify="right")
+    plan_table.add_column("Nearby requests", justify="right")
+
+    if planner is None:
+        tiles = "1"
+        min_requests = len(search_terms)
+        max_requests = len(search_terms) * MAX_PAGES_PER_QUERY
     else:
-        raise NotImplementedError()
+        estimate = planner.estimate(radius, len(search_terms))
+        tiles = f"{estimate.initial_tiles} - {estimate.max_tiles}"
+        min_requests = estimate.min_requests
+        max_requests = estimate.max_requests
+
+    plan_table.add_row(
+        str(len(search_terms)), tiles, f"{min_requests} - {max_requests}"
+    )
+
+    console.print(plan_table)
+    console.print(
+        "[grey70]Plus one geocoding request, and at most one details request per place found[/]"
+    )
+
+    if scheduler is None:
+        return
+
+    min_cost = scheduler.estimate_cost({"places_nearby": min_requests})
+    max_cost = scheduler.estimate_cost({"places_nearby": max_requests})
+    console.print(
+        f"[bold]Estimated nearby search cost:[/] ${min_cost:.2f} - ${max_cost:.2f}"
+    )
+
+    remaining = scheduler.remaining("places_nearby")
+    if remaining is not None:
+        style = "red" if remaining < max_requests else "green"
+        console.print(
+            f"[bold]Nearby requests left this month:[/] [{style}]{remaining}[/]"
+        )
+
+
+def query_novelty(query_planner: QueryPlanner):
+    console.print("\n[bold]New places per search term:[/]")
+
+    novelty_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    novelty_table.add_column("Term")
+    novelty_table.add_column("Overlaps")
+    novelty_table.add_column("Pages", justify="right")
+    novelty_table.add_column("Results", justify="right")
+    novelty_table.add_column("New", justify="right")
+    novelty_table.add_column("Stopped early", justify="right")
+    novelty_table.add_column("Skipped", justify="right")
+
+    for novelty in query_planner.novelty.values():
+        style = "red" if novelty.rate < query_planner.min_novelty else "green"
+        novelty_table.add_row(
+            novelty.term,
+            novelty.overlaps or "-",
+            str(novelty.pages),
+            str(novelty.results),
+            f"{novelty.new} [{style}]({novelty.rate:.0%})[/]",
+            str(novelty.stopped),
+            str(novelty.skipped),
+        )
+
+    console.print(novelty_table)
+
+
+def run_metrics(metrics: Metrics):
+    console.print("\n[bold]Requests:[/]")
+
+    metrics_table = Table(show_header=True, header_style="bold cyan", box=box.ROUNDED)
+    metrics_table.add_column("Endpoint")
+    metrics_table.add_column("Calls", justify="right")
+    metrics_table.add_column("Cache hits", justify="right")
+    metrics_table.add_column("Errors", justify="right")
+    metrics_table.add_column("Retries", justify="right")
+    metrics_table.add_column("Mean latency", justify="right")
+    metrics_table.add_column("Cost", justify="right")
+
+    endpoints = metrics.to_dict()["endpoints"]
+    for endpoint, stats in endpoints.items():
+        mean = (
+            f"{stats['latency_seconds_sum'] / stats['calls'] * 1000:.0f} ms"
+            if stats["calls"]
+            else "-"
+        )
+        metrics_table.add_row(
+            endpoint,
+            str(stats["calls"]),
+            str(stats["cache_hits"]),
+            f"[red]{stats['errors']}[/]" if stats["errors"] else "0",
+            str(stats["retries"]),
+            mean,
+            f"${stats['estimated_cost']:.2f}",
+        )
+
+    console.print(metrics_table)
+
+    total_cost = sum(stats["estimated_cost"] for stats in endpoints.values())
+    console.print(f"[bold]Estimated cost of this run:[/] ${total_cost:.2f}")
@@ -1,13 +1,29 @@
-from collections import defaultdict
+import gc
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Optional
+from enum import StrEnum
+from typing import TYPE_CHECKING, Any, Iterator, Optional
 
-from pydantic import BaseModel, Field, SecretStr, field_validator
+from pydantic import BaseModel, Field, SecretStr, TypeAdapter
 from pydantic_extra_types.coordinate import Latitude, Longitude
 
+if TYPE_CHECKING:
+    from placefinder.columnar import ColumnarPlaces
+    from placefinder.compact import CompactPlaces
+    from placefinder.districts import DistrictIndex
+    from placefinder.spatial import SpatialGrid
+    from placefinder.terms import TermIndex
+
 
 class Env(BaseModel):
     GMAPS_API_KEY: SecretStr = Field(min_length=1)
+    # Point the Google Maps clients elsewhere, e.g. to a local stand-in server
+    GMAPS_BASE_URL: str = "https://maps.googleapis.com"
 
 
 class Location(BaseModel):
@@ -15,6 +31,14 @@ class Location(BaseModel):
     country: str
     radius: int
     districts: list[str]
+    # (latitude, longitude) of the center of each district, see DistrictIndex
+    district_centroids: dict[str, tuple[float, float]] = Field(default_factory=dict)
+    # Other postal codes of districts named after theirs, to the district name
+    district_aliases: dict[str, str] = Field(default_factory=dict)
+    # (latitude, longitude) outline of the districts, places outside are in none
+    boundary: list[tuple[float, float]] = Field(default_factory=list)
+    # What the districts are called, e.g. "Arrondissement"
+    district_label: str = "District"
 
     def __str__(self) -> str:
         return f"{self.name}, {self.country}"
@@ -23,6 +47,143 @@ class Location(BaseModel):
         return str(self)
 
 
+class DetailsPolicy(StrEnum):
+    """Where a place field is taken from"""
+
+    # Nearby search result only, never requests place details
+    SEARCH = "search"
+    # Nearby search result, place details when the result lacks the field
+    IF_MISSING = "if_missing"
+    # Always requested from place details
+    DETAILS = "details"
+
+
+class Tile(BaseModel):
+    """Square area covered by a single nearby search
+
+    Position is the offset of the tile center from the center of the searched
+    location, in meters.
+    """
+
+    x: float
+    y: float
+    size: float
+    depth: int = 0
+
+    @property
+    def radius(self) -> int:
+        """Radius of the circle enclosing the tile, in meters"""
+        return math.ceil(self.size / math.sqrt(2))
+
+
+class SearchEstimate(BaseModel):
+    """Nearby search requests planned for a location, before any request is sent"""
+
+    terms: int
+    initial_tiles: int
+    max_tiles: int
+    min_requests: int
+    max_requests: int
+
+
+class NearbyQuery(BaseModel):
+    """Nearby search of a term, followed page after page"""
+
+    term: str
+    location: dict
+    radius: int
+    # Order the query was planned in, pages are processed query after query in it
+    seq: int = 0
+    # Tile searched, None when the search covers the whole location
+    tile: Optional[Tile] = None
+    # Index of the next page, and the token to request it with
+    page: int = 0
+    page_token: Optional[str] = None
+    # When the token was received, in time.monotonic() seconds
+    token_at: float = 0
+    # The token came from a cached page, it may have expired
+    token_cached: bool = False
+    # Requests of the next page that failed as its token was not valid yet
+    attempts: int = 0
+    # Ignore cached pages
+    refresh: bool = False
+    result_count: int = 0
+    # Pages processed, in order. Pages are requested ahead, a query restarted after
+    # its token expired even requests processed ones again
+    pages_processed: int = 0
+    # No more pages are processed, those still requested are dropped
+    stopped: bool = False
+
+
+class BatchJob(BaseModel):
+    """Searches of the batch runner whose places are merged into one collection"""
+
+    name: str
+    # Keys of Locations.locations
+    locations: list[str]
+    # Each set is searched separately, the job merges all of them
+    term_sets: list[list[str]]
+    # Search tiles of each location, else one "term district" query per district
+    tiling: bool = True
+
+
+class JobSpec(BaseModel):
+    jobs: list[BatchJob]
+
+
+class BatchShard(BaseModel):
+    """Unit of work of the batch runner, searched by a single process"""
+
+    job: str
+    location: str
+    terms: list[str]
+    tiling: bool
+
+
+class QueryNovelty(BaseModel):
+    """New places found by the queries of a search term, see QueryPlanner"""
+
+    term: str
+    # Earlier term sharing all its words with this one, or the other way around
+    overlaps: Optional[str] = None
+    pages: int = 0
+    results: int = 0
+    new: int = 0
+    # Queries stopped before their last page
+    stopped: int = 0
+    # Queries not sent at all
+    skipped: int = 0
+
+    @property
+    def rate(self) -> float:
+        return self.new / self.results if self.results else 1.0
+
+
+class DensityCell(BaseModel):
+    """Square of the map and the places in it, see PlaceCollection.get_density"""
+
+    # Center of the square
+    latitude: float
+    longitude: float
+    # Side of the square, in meters
+    size: int
+    count: int
+    # Of the rated places in the square
+    mean_rating: Optional[float] = None
+
+
+class DuplicateGroup(BaseModel):
+    """Places under different place_ids that are probably the same, see find_duplicates"""
+
+    place_ids: list[str]
+    names: list[str]
+    # Place to keep if merged, the one with the most reviews
+    keep: str
+    # Largest distance in meters and lowest name similarity between matched places
+    distance: float
+    similarity: float
+
+
 class PlacePhoto(BaseModel):
     height: int
     html_attributions: list[str]
@@ -30,56 +191,317 @@ class PlacePhoto(BaseModel):
     width: int
 
 
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now_timestamp() -> str:
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
 class Place(BaseModel):
     """Pydantic model for a place"""
 
     place_id: str
     name: str
     address: str
-    rating: Optional[float] = None
-    total_ratings: Optional[int] = None
+    # Constraints rather than validators, so they are checked by pydantic-core
+    # without calling back into Python for every place
+    rating: Optional[float] = Field(default=None, ge=0, le=5)
+    total_ratings: Optional[int] = Field(default=None, ge=0)
     latitude: Latitude
     longitude: Longitude
     opening_hours: Optional[str] = None
-    timestamp: str = Field(
-        default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    )
+    timestamp: str = Field(default_factory=now_timestamp)
     menu_terms: list[str] = Field(default_factory=list)
     photos: list[PlacePhoto] = Field(default_factory=list)
 
-    @field_validator("rating")
-    @classmethod
-    def validate_rating(cls, v):
-        if v is not None and (v < 0 or v > 5):
-            raise ValueError("Rating must be between 0 and 5")
-        return v
-
-    @field_validator("total_ratings")
-    @classmethod
-    def validate_total_ratings(cls, v):
-        if v is not None and v < 0:
-            raise ValueError("Total ratings cannot be negative")
-        return v
-
     model_config = {
         "validate_assignment": True,
         "extra": "ignore",  # Ignore extra fields from Google API
     }
 
 
-class PlaceCollection:
-    """Collection of places with helper methods"""
+# Validates a whole list of places in a single call
+PLACES_ADAPTER = TypeAdapter(list[Place])
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """Pause the garbage collector while building many objects
+
+    Each allocation counts towards the next collection, so building places in bulk
+    triggers collections walking every place built so far, and none of them is garbage.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def validate_places(raws: list[dict], timestamp: Optional[str] = None) -> list[Place]:
+    """Validate raw places at once, sharing one timestamp
+
+    Args:
+        raws (list[dict]): Places as dictionaries, their photos as dictionaries too
+        timestamp (str, optional): Timestamp of places without one, defaults to now
+    """
+    timestamp = timestamp or now_timestamp()
+
+    with paused_gc():
+        return PLACES_ADAPTER.validate_python(
+            [
+                raw if "timestamp" in raw else {**raw, "timestamp": timestamp}
+                for raw in raws
+            ]
+        )
+
+
+def load_places(rows: list[str]) -> list[Place]:
+    """Load places serialized with `model_dump_json`, e.g. by the place store
+
+    The rows are joined into a single JSON array and validated in one pass by
+    pydantic-core, which is faster than `model_construct` on parsed dictionaries.
+    """
+    if not rows:
+        return []
+
+    return PLACES_ADAPTER.validate_json("[" + ",".join(rows) + "]")
+
+
+RATING_BUCKETS = [
+    "Excellent (4.5-5.0)",
+    "Very Good (4.0-4.4)",
+    "Good (3.5-3.9)",
+    "Average (3.0-3.4)",
+    "Below Average (<3.0)",
+    "Not Rated",
+]
+
+
+def rating_bucket(rating: Optional[float]) -> str:
+    """Get the rating distribution label of a rating"""
+    if rating is None:
+        return "Not Rated"
+    elif rating >= 4.5:
+        return "Excellent (4.5-5.0)"
+    elif rating >= 4.0:
+        return "Very Good (4.0-4.4)"
+    elif rating >= 3.5:
+        return "Good (3.5-3.9)"
+    elif rating >= 3.0:
+        return "Average (3.0-3.4)"
+    return "Below Average (<3.0)"
+
+
+def tokenize(text: str) -> tuple[str, ...]:
+    """Lowercase words of a text, without accents or punctuation"""
+    text = text.casefold()
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return tuple(re.findall(r"\w+", text))
+
+
+def is_suspicious(place: Place) -> bool:
+    """Places not rated, with less than 20 reviews or a rating greater or equal to 4.9"""
+    return (
+        place.rating is None
+        or place.total_ratings is None
+        or place.rating >= 4.9
+        or place.total_ratings < 20
+    )
+
+
+class _RatingIndex:
+    """Insertion indexes of places, by rating then insertion order
+
+    Places are bucketed by rating, so adding one only appends to its bucket: the
+    distinct ratings alone are sorted, on read after a new one appeared.
+    The live summary reads it from its refresh thread while places are added, the
+    sorted ratings are guarded by a lock.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: dict[float, list[int]] = {}
+        self.lock = threading.Lock()
+        # Ratings of the buckets from the best, None until the next read
+        self._ratings: Optional[list[float]] = None
+
+    def add(self, rating: float, index: int) -> None:
+        bucket = self.buckets.get(rating)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets[rating] = []
+                self._ratings = None
+        # Indexes only grow, buckets stay sorted
+        bucket.append(index)
+
+    def top(self, n: int) -> list[int]:
+        with self.lock:
+            if self._ratings is None:
+                self._ratings = sorted(self.buckets, reverse=True)
+            # Replaced, never modified, once a new rating appears
+            ratings = self._ratings
+
+        indexes: list[int] = []
+        for rating in ratings:
+            if len(indexes) >= n:
+                break
+            indexes.extend(self.buckets[rating][: n - len(indexes)])
 
-    def __init__(self):
-        self.places: list[Place] = []
+        return indexes
+
+
+class PlaceCollection:
+    """Collection of places with helper methods
+
+    Places are indexed by place_id, and the indexes used by the summary queries are
+    maintained on insertion, so places must not be modified once added.
+
+    Args:
+        compact (bool, optional): Store places as columns rather than Place objects,
+            for collections of hundreds of thousands of places. Places are then
+            rebuilt on every access, see CompactPlaces.
+        districts (DistrictIndex, optional): Districts counted by
+            get_district_distribution, from the coordinates of the places
+    """
+
+    def __init__(
+        self, compact: bool = False, districts: Optional["DistrictIndex"] = None
+    ):
+        self.places: "list[Place] | CompactPlaces"
+        if compact:
+            # Imported here, placefinder.compact depends on this module
+            from placefinder.compact import CompactPlaces
+
+            self.places = CompactPlaces()
+        else:
+            self.places = []
+        # Index of each place in self.places, by place_id
+        self._index: dict[str, int] = {}
+        # Places by rating, indexes refer to self.places
+        self._by_rating = _RatingIndex()
+        self._trusted_by_rating = _RatingIndex()
+        self._rating_counts: dict[str, int] = dict.fromkeys(RATING_BUCKETS, 0)
+        self.districts = districts
+        # Places per district, in the order of self.districts.names
+        self._district_counts: list[int] = [0] * len(districts or [])
+        self._columnar: Optional["ColumnarPlaces"] = None
+        self._grid: Optional["SpatialGrid"] = None
+        self._terms: Optional["TermIndex"] = None
+        self._indexed_terms = 0
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def __contains__(self, place_id: str) -> bool:
+        return place_id in self._index
+
+    def get(self, place_id: str) -> Optional[Place]:
+        index = self._index.get(place_id)
+        return None if index is None else self.places[index]
 
     def add_place(self, place: Place) -> bool:
         """Add a place to the collection if it doesn't exist already"""
-        # Check if place already exists
-        if not any(existing.place_id == place.place_id for existing in self.places):
-            self.places.append(place)
-            return True
-        return False
+        if place.place_id in self._index:
+            return False
+
+        index = len(self.places)
+        self.places.append(place)
+        self._index[place.place_id] = index
+
+        self._by_rating.add(place.rating or 0, index)
+        if not is_suspicious(place):
+            self._trusted_by_rating.add(place.rating or 0, index)
+
+        self._rating_counts[rating_bucket(place.rating)] += 1
+
+        if self.districts is not None:
+            district = self.districts.locate(
+                place.latitude, place.longitude, place.address
+            )
+            if district >= 0:
+                self._district_counts[district] += 1
+
+        return True
+
+    def columnar(self) -> "ColumnarPlaces":
+        """Columnar NumPy view of the collection, rows match self.places
+
+        The view is built on first use, then only extended with places added since.
+        """
+        # Imported here so NumPy is only loaded when the view is used
+        from placefinder.columnar import ColumnarPlaces
+
+        if self._columnar is None:
+            self._columnar = ColumnarPlaces(districts=self.districts)
+
+        self._columnar.extend(self.places[len(self._columnar) :])
+
+        return self._columnar
+
+    def spatial(self) -> "SpatialGrid":
+        """Spatial index of the collection, points are indexes in self.places
+
+        The index is built on first use, then only extended with places added since.
+        """
+        from placefinder.spatial import SpatialGrid
+
+        if self._grid is None:
+            self._grid = SpatialGrid()
+
+        start = len(self._grid)
+        if isinstance(self.places, list):
+            self._grid.extend(
+                (place.latitude, place.longitude) for place in self.places[start:]
+            )
+        else:
+            # Read from the columns, without rebuilding the places
+            self._grid.extend(
+                zip(self.places.latitude[start:], self.places.longitude[start:])
+            )
+
+        return self._grid
+
+    def get_places_within(
+        self, latitude: float, longitude: float, radius: float
+    ) -> list[Place]:
+        """Get places within `radius` meters of a point, from the nearest"""
+        return [
+            self.places[index]
+            for _, index in self.spatial().within(latitude, longitude, radius)
+        ]
+
+    def get_nearest(self, latitude: float, longitude: float, n: int = 5) -> list[Place]:
+        """Get the N places nearest to a point, from the nearest"""
+        return [
+            self.places[index]
+            for _, index in self.spatial().nearest(latitude, longitude, n)
+        ]
+
+    def get_density(self, cell_size: int = 500, top: int = 10) -> list[DensityCell]:
+        """Get the squares of the map holding the most places, from the densest
+
+        Args:
+            cell_size: Side of the squares in meters, rounded to the spatial index cells
+            top: Number of squares returned
+        """
+        squares = []
+
+        for square, indexes in self.spatial().density(cell_size, top):
+            ratings = [
+                rating
+                for rating in (self.places[index].rating for index in indexes)
+                if rating is not None
+            ]
+            if ratings:
+                square.mean_rating = sum(ratings) / len(ratings)
+            squares.append(square)
+
+        return squares
 
     def to_list(self) -> list[dict[str, Any]]:
         """Convert collection to list of dictionaries"""
@@ -93,85 +515,97 @@ class PlaceCollection:
             n: Number of places to return
             exclude_suspicious: If True, exclude places with less than 20 reviews and rating greater or equal to 4.9
         """
+        ordered = self._trusted_by_rating if exclude_suspicious else self._by_rating
 
-        if exclude_suspicious:
-            return sorted(
-                [
-                    place
-                    for place in self.places
-                    if place.rating is not None
-                    and place.total_ratings is not None
-                    and place.rating < 4.9
-                    and place.total_ratings >= 20
-                ],
-                key=lambda x: x.rating or 0,
-                reverse=True,
-            )[:n]
-
-        return sorted(
-            self.places,
-            key=lambda x: x.rating or 0,
-            reverse=True,
-        )[:n]
+        return [self.places[index] for index in ordered.top(n)]
 
     def get_rating_distribution(self) -> dict[str, int]:
         """Get rating distribution counts"""
-        distribution = {
-            "Excellent (4.5-5.0)": 0,
-            "Very Good (4.0-4.4)": 0,
-            "Good (3.5-3.9)": 0,
-            "Average (3.0-3.4)": 0,
-            "Below Average (<3.0)": 0,
-            "Not Rated": 0,
-        }
+        return dict(self._rating_counts)
+
+    def terms(self) -> "TermIndex":
+        """Inverted index of the menu terms, places are indexes in self.places
 
-        for place in self.places:
-            rating = place.rating
-            if rating is None:
-                distribution["Not Rated"] += 1
-            elif rating >= 4.5:
-                distribution["Excellent (4.5-5.0)"] += 1
-            elif rating >= 4.0:
-                distribution["Very Good (4.0-4.4)"] += 1
-            elif rating >= 3.5:
-                distribution["Good (3.5-3.9)"] += 1
-            elif rating >= 3.0:
-                distribution["Average (3.0-3.4)"] += 1
-            else:
-                distribution["Below Average (<3.0)"] += 1
-
-        return distribution
+        The index is built on first use, then only extended with places added since.
+        """
+        from placefinder.terms import TermIndex
+
+        if self._terms is None:
+            self._terms = TermIndex()
+
+        start = self._indexed_terms
+        menu_terms = (
+            (place.menu_terms for place in self.places[start:])
+            if isinstance(self.places, list)
+            else self.places.menu_terms[start:]
+        )
+        for index, terms in enumerate(menu_terms, start):
+            self._terms.add(index, terms)
+        self._indexed_terms = len(self.places)
+
+        return self._terms
+
+    def _rating(self, index: int) -> float:
+        if isinstance(self.places, list):
+            return self.places[index].rating or 0
+        rating = self.places.rating[index]
+        return 0 if rating != rating else rating
+
+    def search(
+        self,
+        query: list[str],
+        match_all: bool = False,
+        prefix: bool = True,
+        typos: bool = True,
+        n: Optional[int] = None,
+    ) -> list[Place]:
+        """
+        Search places by menu terms, best rated first
+
+        Args:
+            query: Terms to look for, e.g. ["bubble tea", "matcha"]
+            match_all: If True, places must have every word of the query, else any
+            prefix: If True, words also match terms they start, "mat" finds "matcha"
+            typos: If True, words of 4 letters or more also match terms one typo away
+            n: Number of places to return, all by default
+        """
+        matches = self.terms().search(query, match_all, prefix, typos)
+        ranked = heapq.nsmallest(
+            len(matches) if n is None else n,
+            matches,
+            key=lambda index: (-self._rating(index), index),
+        )
+
+        return [self.places[index] for index in ranked]
 
     def get_places_with_menu_terms(self, terms: list[str]) -> list[Place]:
-        """Get places that have any of the specified terms in their menu"""
+        """Get places that have any of the specified terms in their menu
+
+        Terms match whole menu terms, case-insensitively: "bubble tea" does not
+        find a place with only "tea".
+        """
+        wanted = {term.lower() for term in terms}
+        index = self.terms()
+
+        # Places having every word of a term, then checked for the term itself
+        candidates: set[int] = set()
+        for term in wanted:
+            candidates |= index.search([term], match_all=True)
+
+        places = (self.places[i] for i in sorted(candidates))
         return [
             place
-            for place in self.places
-            if any(
-                term.lower() in [t.lower() for t in place.menu_terms] for term in terms
-            )
+            for place in places
+            if any(term.lower() in wanted for term in place.menu_terms)
         ]
 
     def get_district_distribution(self) -> dict[str, int]:
-        """Get distribution by Paris arrondissement"""
-        districts: defaultdict = defaultdict(int)
-
-        for place in self.places:
-            district = None
-            address = place.address
-
-            # Look for the Paris postal code pattern (750XX)
-            if "750" in address:
-                for word in address.split():
-                    if (
-                        word.startswith("750")
-                        and len(word) >= 5
-                        and word[3:5].isdigit()
-                    ):
-                        district = word[3:5]
-                        break
-
-            if district:
-                districts[district] += 1
-
-        return districts
+        """Get the number of places per district, for districts having any"""
+        if self.districts is None:
+            return {}
+
+        return {
+            name: count
+            for name, count in zip(self.districts.names, self._district_counts)
+            if count
+        }
@@ -0,0 +1,143 @@
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from placefinder.t import tokenize
+
+# Query words shorter than this only match exactly, typos would match too much
+TYPO_MIN_LENGTH = 4
+
+
+@lru_cache(maxsize=65_536)
+def _words(term: str) -> tuple[str, ...]:
+    # Menu terms repeat across places, tokenize each one once
+    return tokenize(term)
+
+
+def _deletes(word: str) -> set[str]:
+    return {word[:i] + word[i + 1 :] for i in range(len(word))}
+
+
+def _one_edit(word: str, other: str) -> bool:
+    """Whether two different words are one insertion, deletion, substitution or
+    transposition of adjacent letters apart"""
+    if abs(len(word) - len(other)) > 1:
+        return False
+
+    if len(word) == len(other):
+        diff = [i for i, (a, b) in enumerate(zip(word, other)) if a != b]
+        return len(diff) == 1 or (
+            len(diff) == 2
+            and diff[1] == diff[0] + 1
+            and word[diff[0]] == other[diff[1]]
+            and word[diff[1]] == other[diff[0]]
+        )
+
+    shorter, longer = sorted((word, other), key=len)
+    return shorter in _deletes(longer)
+
+
+class TermIndex:
+    """Inverted index of terms, e.g. menu terms, to the places having them
+
+    Terms are split into words, lowercased and stripped of accents. Places are
+    identified by their insertion index, which PlaceCollection keeps equal to the
+    index of the place, and are added in increasing order.
+
+    Prefix lookups use the sorted vocabulary. Typo lookups use the deletions of
+    every word of the vocabulary (symmetric delete), built on the first typo
+    lookup only, then kept up to date.
+    """
+
+    def __init__(self) -> None:
+        self.postings: dict[str, list[int]] = defaultdict(list)
+        self._sorted: list[str] = []
+        # Words of the vocabulary by their own value and every one-letter deletion,
+        # None until a typo lookup needs them
+        self._variants: Optional[dict[str, set[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def add(self, index: int, terms: Iterable[str]) -> None:
+        for word in {word for term in terms for word in _words(term)}:
+            postings = self.postings[word]
+
+            if not postings:
+                # New word, the sorted vocabulary is rebuilt on the next prefix lookup
+                self._sorted.clear()
+                if self._variants is not None:
+                    self._add_variants(word)
+
+            if not postings or postings[-1] != index:
+                postings.append(index)
+
+    def _add_variants(self, word: str) -> None:
+        assert self._variants is not None
+        for variant in _deletes(word) | {word}:
+            self._variants.setdefault(variant, set()).add(word)
+
+    def expand(self, word: str, prefix: bool = False, typos: bool = False) -> set[str]:
+        """Words of the vocabulary a normalized query word matches
+
+        Args:
+            word (str)
+            prefix (bool, optional): Also match words starting with the query word
+            typos (bool, optional): Also match words one edit away from the query word
+        """
+        words = {word} if word in self.postings else set()
+
+        if prefix:
+            if not self._sorted:
+                self._sorted = sorted(self.postings)
+            i = bisect_left(self._sorted, word)
+            while i < len(self._sorted) and self._sorted[i].startswith(word):
+                words.add(self._sorted[i])
+                i += 1
+
+        if typos and len(word) >= TYPO_MIN_LENGTH:
+            if self._variants is None:
+                self._variants = {}
+                for known in self.postings:
+                    self._add_variants(known)
+
+            # Words sharing the query word or one of its deletions, checked as the
+            # shared deletion may be two edits away
+            for variant in _deletes(word) | {word}:
+                for candidate in self._variants.get(variant, ()):
+                    if candidate not in words and _one_edit(word, candidate):
+                        words.add(candidate)
+
+        return words
+
+    def search(
+        self,
+        query: Iterable[str],
+        match_all: bool = False,
+        prefix: bool = False,
+        typos: bool = False,
+    ) -> set[int]:
+        """Places matching the words of a query
+
+        Args:
+            query (Iterable[str]): Terms, split into words
+            match_all (bool, optional): Places must match every word, else any
+            prefix (bool, optional): See expand
+            typos (bool, optional): See expand
+        """
+        matches = []
+        for word in dict.fromkeys(word for term in query for word in _words(term)):
+            places: set[int] = set()
+            for match in self.expand(word, prefix, typos):
+                places.update(self.postings[match])
+            matches.append(places)
+
+        if not matches:
+            return set()
+
+        if match_all:
+            matches.sort(key=len)
+            return matches[0].intersection(*matches[1:])
+
+        return set().union(*matches)
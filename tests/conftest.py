@@ -0,0 +1,18 @@
+import pytest
+
+from placefinder.districts import DistrictIndex
+from placefinder.Locations import locations
+from placefinder.t import Place
+from tests.places import make_places
+
+
+@pytest.fixture(scope="session")
+def places() -> list[Place]:
+    return make_places(2000)
+
+
+@pytest.fixture(scope="session")
+def paris_districts() -> DistrictIndex:
+    districts = DistrictIndex.from_locations([locations["fr-paris"]])
+    assert districts is not None
+    return districts
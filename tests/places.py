@@ -0,0 +1,42 @@
+import random
+
+from placefinder.t import Place, PlacePhoto
+
+PARIS = (48.8566, 2.3522)
+MENU_TERMS = ["matcha", "boba", "taro", "brown sugar", "crêpe", "Bubble Tea", "tea"]
+
+
+def make_places(size: int, seed: int = 0) -> list[Place]:
+    """Places spread over central Paris, some without rating, reviews or photos"""
+    rng = random.Random(seed)
+    photos = [
+        PlacePhoto(
+            height=600, width=800, photo_reference=f"photo-{i}", html_attributions=[]
+        )
+        for i in range(10)
+    ]
+    places = []
+
+    for i in range(size):
+        district = rng.randint(1, 20)
+        places.append(
+            Place(
+                place_id=f"place-{i}",
+                name=f"Place {i % 50}",
+                address=(
+                    f"{i} Rue Test, 750{district:02d} Paris, France"
+                    if rng.random() < 0.7
+                    else f"{i} Rue Test, Paris"
+                ),
+                rating=None if rng.random() < 0.1 else round(rng.uniform(1, 5), 1),
+                total_ratings=None if rng.random() < 0.1 else rng.randint(0, 500),
+                latitude=PARIS[0] + rng.uniform(-0.05, 0.05),
+                longitude=PARIS[1] + rng.uniform(-0.08, 0.08),
+                opening_hours=rng.choice([None, "Monday: 9:00 AM – 6:00 PM"]),
+                timestamp=f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)} 12:00:00",
+                menu_terms=rng.sample(MENU_TERMS, rng.randint(0, 3)),
+                photos=rng.sample(photos, rng.randint(0, 2)),
+            )
+        )
+
+    return places
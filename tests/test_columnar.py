@@ -0,0 +1,66 @@
+import random
+
+import numpy as np
+
+from placefinder import districts as scalar
+from placefinder.columnar import ColumnarPlaces, contains
+from placefinder.Locations import locations
+from placefinder.t import PlaceCollection
+
+
+def test_matches_collection(places, paris_districts):
+    collection = PlaceCollection(districts=paris_districts)
+    for place in places:
+        collection.add_place(place)
+    columnar = ColumnarPlaces(places, districts=paris_districts)
+
+    for n in (1, 5, 100):
+        for exclude_suspicious in (True, False):
+            top = collection.get_top_rated(n, exclude_suspicious)
+            rows = columnar.top_rated(n, exclude_suspicious)
+            assert [places[row] for row in rows] == top
+
+    assert columnar.rating_distribution() == collection.get_rating_distribution()
+    assert columnar.district_distribution() == collection.get_district_distribution()
+
+
+def test_districts_match_scalar_locate(places, paris_districts):
+    columnar = ColumnarPlaces(places, districts=paris_districts)
+
+    assert list(columnar.district[: len(columnar)]) == [
+        paris_districts.locate(place.latitude, place.longitude, place.address)
+        for place in places
+    ]
+
+
+def test_extended_view_matches_view_built_at_once(places, paris_districts):
+    collection = PlaceCollection(districts=paris_districts)
+    for place in places[:700]:
+        collection.add_place(place)
+    collection.columnar()
+    for place in places[700:]:
+        collection.add_place(place)
+
+    extended = collection.columnar()
+    built = ColumnarPlaces(places, districts=paris_districts)
+
+    assert len(extended) == len(built) == len(places)
+    for column in ("rating", "total_ratings", "latitude", "longitude", "district"):
+        np.testing.assert_array_equal(
+            getattr(extended, column)[: len(places)],
+            getattr(built, column)[: len(places)],
+        )
+
+
+def test_contains_matches_scalar():
+    boundary = locations["fr-paris"].boundary
+    rng = random.Random(0)
+    points = [
+        (48.8566 + rng.uniform(-0.1, 0.1), 2.3522 + rng.uniform(-0.15, 0.15))
+        for _ in range(2000)
+    ]
+    latitude, longitude = np.array(points).T
+
+    assert list(contains(boundary, latitude, longitude)) == [
+        scalar.contains(boundary, lat, lng) for lat, lng in points
+    ]
@@ -0,0 +1,53 @@
+from placefinder.compact import CompactPlaces
+from placefinder.t import PlaceCollection
+from tests.places import PARIS
+
+
+def test_round_trip(places):
+    compact = CompactPlaces()
+    for place in places:
+        compact.append(place)
+
+    assert len(compact) == len(places)
+    assert [place.model_dump() for place in compact] == [
+        place.model_dump() for place in places
+    ]
+    assert [place.model_dump() for place in compact[10:20]] == [
+        place.model_dump() for place in places[10:20]
+    ]
+
+
+def test_photos_stored_once(places):
+    compact = CompactPlaces()
+    for place in places:
+        compact.append(place)
+
+    assert len(compact.photos) == len(
+        {photo.photo_reference for place in places for photo in place.photos}
+    )
+
+
+def test_materialized_place_is_a_copy(places):
+    compact = CompactPlaces()
+    compact.append(places[0])
+
+    compact[0].menu_terms.append("changed")
+
+    assert compact[0].menu_terms == places[0].menu_terms
+
+
+def test_collection_queries_match(places):
+    listed, compact = PlaceCollection(), PlaceCollection(compact=True)
+    for place in places:
+        listed.add_place(place)
+        compact.add_place(place)
+
+    for exclude_suspicious in (True, False):
+        assert listed.get_top_rated(20, exclude_suspicious) == compact.get_top_rated(
+            20, exclude_suspicious
+        )
+    assert listed.get_rating_distribution() == compact.get_rating_distribution()
+    assert listed.get_places_within(*PARIS, 1000) == compact.get_places_within(
+        *PARIS, 1000
+    )
+    assert listed.search(["mat", "bobba"]) == compact.search(["mat", "bobba"])
@@ -0,0 +1,101 @@
+import pytest
+
+from placefinder.dedupe import find_duplicates, name_similarity
+from placefinder.planner import METERS_PER_DEGREE
+from placefinder.t import Place, PlaceCollection
+from tests.places import PARIS, make_places
+
+
+def place(place_id, name, north=0.0, total_ratings=None):
+    """Place `north` meters north of central Paris"""
+    return Place(
+        place_id=place_id,
+        name=name,
+        address="Paris",
+        latitude=PARIS[0] + north / METERS_PER_DEGREE,
+        longitude=PARIS[1],
+        total_ratings=total_ratings,
+    )
+
+
+def collection_of(places, compact=False):
+    collection = PlaceCollection(compact=compact)
+    for added in places:
+        collection.add_place(added)
+    return collection
+
+
+def groups_of(places, compact=False):
+    return [
+        sorted(group.place_ids)
+        for group in find_duplicates(collection_of(places, compact))
+    ]
+
+
+def test_name_similarity():
+    assert name_similarity("starbucks", "starbucks coffee") == 1.0
+    assert name_similarity("starbucks", "starbuck") >= 0.85
+    assert name_similarity("starbucks", "") == 0.0
+    # "kebab" is generic, sharing it is not enough
+    assert name_similarity("kebab", "istanbul kebab", {"kebab"}) < 0.85
+
+
+def test_groups_close_places_with_similar_names():
+    places = [
+        place("a", "Starbucks", 0, total_ratings=10),
+        place("b", "STARBUCKS Coffee", 30, total_ratings=200),
+        place("c", "Starbucks", 300),
+        place("d", "Pizza Hut", 10),
+    ]
+
+    groups = find_duplicates(collection_of(places))
+
+    assert [group.place_ids for group in groups] == [["a", "b"]]
+    assert groups[0].keep == "b"
+    assert groups[0].distance == pytest.approx(30, abs=0.5)
+
+
+def test_chains_matches():
+    places = [
+        place("a", "Café de Flore", 0),
+        place("b", "Cafe de Flore Paris", 60),
+        place("c", "Café de Flore Paris", 120),
+    ]
+
+    assert groups_of(places) == [["a", "b", "c"]]
+
+
+def test_generic_names_do_not_chain():
+    kebabs = ["Istanbul Kebab", "Ali Kebab", "Kebab House", "Best Kebab", "Momo Kebab"]
+    places = [place("kebab", "Kebab", 0)] + [
+        place(f"shop-{i}", name, 10 * (i + 1)) for i, name in enumerate(kebabs)
+    ]
+    places.append(place("other-kebab", "Kebab", 50))
+    # Close enough in spelling, but a single generic word only groups with its own name
+    places.append(place("kebabs", "Kebabs", 20))
+
+    assert groups_of(places) == [["kebab", "other-kebab"]]
+
+
+def test_compact_collection_gives_the_same_groups():
+    places = make_places(1000)
+    # Near copies of some places
+    places += [
+        place.model_copy(
+            update={
+                "place_id": f"copy-{place.place_id}",
+                "name": place.name.upper(),
+                "latitude": place.latitude + 0.0002,
+            }
+        )
+        for place in places[::50]
+    ]
+
+    listed = groups_of(places)
+
+    assert listed == groups_of(places, compact=True)
+    for copied in places[::50][:20]:
+        assert any(
+            {copied.place_id, f"copy-{copied.place_id}"} <= set(group)
+            for group in listed
+        )
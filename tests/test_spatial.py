@@ -0,0 +1,107 @@
+import math
+import random
+
+import pytest
+
+from placefinder.planner import METERS_PER_DEGREE
+from placefinder.spatial import GRID_CELL_SIZE, SpatialGrid
+from tests.places import PARIS
+
+
+def brute_force(grid, latitude, longitude):
+    x, y = longitude * grid.scale, latitude * METERS_PER_DEGREE
+    return sorted(
+        (math.hypot(grid.x[i] - x, grid.y[i] - y), i) for i in range(len(grid))
+    )
+
+
+def on_grid(grid, i, j):
+    """(latitude, longitude) of the corner of cell (i, j)"""
+    return (
+        j * GRID_CELL_SIZE / METERS_PER_DEGREE,
+        i * GRID_CELL_SIZE / grid.scale,
+    )
+
+
+@pytest.fixture(scope="module")
+def grid(places):
+    grid = SpatialGrid()
+    grid.extend((place.latitude, place.longitude) for place in places)
+    # Points on cell corners and edges, exactly at cell size multiples
+    i, j = grid._cell(*grid._project(*PARIS))
+    grid.extend(
+        [on_grid(grid, i + di, j + dj) for di in range(-2, 3) for dj in range(-2, 3)]
+    )
+    grid.extend(
+        [
+            (on_grid(grid, i, j + 1)[0], on_grid(grid, i, j)[1] + 1e-9),
+            (on_grid(grid, i, j)[0] - 1e-9, on_grid(grid, i + 1, j)[1]),
+        ]
+    )
+    return grid
+
+
+def queries(grid):
+    """Points on cell corners and edges, and random ones"""
+    i, j = grid._cell(*grid._project(*PARIS))
+    rng = random.Random(1)
+    points = [
+        on_grid(grid, i + di, j + dj) for di in range(-1, 2) for dj in range(-1, 2)
+    ]
+    points += [
+        (
+            on_grid(grid, i, j)[0] + GRID_CELL_SIZE / 2 / METERS_PER_DEGREE,
+            on_grid(grid, i, j)[1],
+        )
+    ]
+    points += [
+        (PARIS[0] + rng.uniform(-0.05, 0.05), PARIS[1] + rng.uniform(-0.08, 0.08))
+        for _ in range(20)
+    ]
+    return points
+
+
+@pytest.mark.parametrize("radius", [0, 1, 249, 250, 251, 500, 1200])
+def test_within_matches_brute_force(grid, radius):
+    for latitude, longitude in queries(grid):
+        expected = [
+            found
+            for found in brute_force(grid, latitude, longitude)
+            if found[0] <= radius
+        ]
+        assert grid.within(latitude, longitude, radius) == expected
+
+
+def test_within_includes_points_at_the_radius(grid):
+    latitude, longitude = on_grid(grid, *grid._cell(*grid._project(*PARIS)))
+    # The corner one cell up is exactly a cell size away
+    found = grid.within(latitude, longitude, GRID_CELL_SIZE)
+    assert any(distance == pytest.approx(GRID_CELL_SIZE) for distance, _ in found)
+
+
+@pytest.mark.parametrize("k", [1, 5, 50, 3000])
+def test_nearest_matches_brute_force(grid, k):
+    for latitude, longitude in queries(grid):
+        assert (
+            grid.nearest(latitude, longitude, k)
+            == brute_force(grid, latitude, longitude)[:k]
+        )
+
+
+def test_density_counts_every_point(grid):
+    squares = grid.density(500)
+
+    assert sum(square.count for square, _ in squares) == len(grid)
+    assert sorted(index for _, indexes in squares for index in indexes) == list(
+        range(len(grid))
+    )
+    assert [square.count for square, _ in squares] == sorted(
+        (square.count for square, _ in squares), reverse=True
+    )
+
+
+def test_empty_grid():
+    grid = SpatialGrid()
+
+    assert grid.within(*PARIS, 1000) == []
+    assert grid.nearest(*PARIS, 5) == []
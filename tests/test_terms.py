@@ -0,0 +1,104 @@
+import pytest
+
+from placefinder.t import Place, PlaceCollection
+from placefinder.terms import TermIndex, _one_edit
+
+TERMS = [
+    ["matcha", "boba"],
+    ["tomato"],
+    ["Crêpe", "brown sugar"],
+    ["bubble tea"],
+    ["tea"],
+    ["taro", "teas"],
+]
+
+
+@pytest.fixture
+def index():
+    index = TermIndex()
+    for i, terms in enumerate(TERMS):
+        index.add(i, terms)
+    return index
+
+
+def test_exact_words(index):
+    assert index.search(["matcha"]) == {0}
+    assert index.search(["mat"]) == set()
+    assert index.search(["matcah"]) == set()
+
+
+def test_prefix(index):
+    assert index.search(["mat"], prefix=True) == {0}
+    assert index.search(["t"], prefix=True) == {1, 3, 4, 5}
+    # Only the start of words, not "tomato"
+    assert index.search(["ato"], prefix=True) == set()
+
+
+def test_typos(index):
+    # Transposition, insertion, deletion, substitution
+    assert index.search(["matcah"], typos=True) == {0}
+    assert index.search(["bobba"], typos=True) == {0}
+    assert index.search(["tomto"], typos=True) == {1}
+    assert index.search(["sugor"], typos=True) == {2}
+    # Two edits away
+    assert index.search(["mtacah"], typos=True) == set()
+    # Words shorter than TYPO_MIN_LENGTH only match exactly
+    assert index.search(["tae"], typos=True) == set()
+
+
+def test_accents_and_case(index):
+    assert index.search(["crepe"]) == {2}
+    assert index.search(["CRÊPE"]) == {2}
+
+
+def test_match_all(index):
+    assert index.search(["bubble", "tea"]) == {3, 4}
+    assert index.search(["bubble", "tea"], match_all=True) == {3}
+    assert index.search(["bubble tea", "matcha"], match_all=True) == set()
+
+
+def test_words_added_after_a_typo_lookup(index):
+    assert index.search(["oolong"], typos=True) == set()
+
+    index.add(len(TERMS), ["oolong"])
+
+    assert index.search(["olong"], typos=True) == {len(TERMS)}
+    assert index.search(["oolo"], prefix=True) == {len(TERMS)}
+
+
+@pytest.mark.parametrize(
+    "word, other, expected",
+    [
+        ("matcha", "matcah", True),
+        ("matcha", "matca", True),
+        ("matcha", "matchas", True),
+        ("matcha", "matcho", True),
+        ("matcha", "mtacah", False),
+        ("matcha", "match", True),
+        ("boba", "taro", False),
+    ],
+)
+def test_one_edit(word, other, expected):
+    assert _one_edit(word, other) is expected
+
+
+def test_collection_menu_terms_match_whole_terms():
+    collection = PlaceCollection()
+    for i, terms in enumerate(TERMS):
+        collection.add_place(
+            Place(
+                place_id=f"place-{i}",
+                name="Place",
+                address="Paris",
+                latitude=48.85,
+                longitude=2.35,
+                menu_terms=terms,
+            )
+        )
+
+    found = collection.get_places_with_menu_terms(["Bubble Tea", "crêpe"])
+
+    assert [place.place_id for place in found] == ["place-2", "place-3"]
+    assert [
+        place.place_id for place in collection.get_places_with_menu_terms(["tea"])
+    ] == ["place-4"]